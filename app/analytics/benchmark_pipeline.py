@@ -0,0 +1,196 @@
+# app/analytics/benchmark_pipeline.py
+"""
+Micro-benchmark: old per-row analytics vs. the vectorized pipeline.
+
+    python -m app.analytics.benchmark_pipeline [rows]
+
+Uses synthetic log rows only (no database access). The views no longer
+aggregate raw logs in Python (the usage totals are grouped in the database,
+see get_usage_totals()), so the vectorized version lives here with the
+benchmark that compares it to the old per-row code.
+"""
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+
+MOVEMENT_COLUMNS = ["day", "article_number", "user_name", "action", "quantity"]
+
+
+def prepare_movements(records):
+    """Normalize log/rollup rows into a typed movements frame (no per-row Python)."""
+    df = pd.DataFrame.from_records(records or [])
+    if df.empty:
+        return pd.DataFrame({
+            "day": pd.Series(dtype="datetime64[ns, UTC]"),
+            "article_number": pd.Series(dtype="object"),
+            "user_name": pd.Series(dtype="object"),
+            "action": pd.Series(dtype="object"),
+            "quantity": pd.Series(dtype="int64"),
+        })
+
+    for col in ["article_number", "user_name", "action", "quantity"]:
+        if col not in df.columns:
+            df[col] = ""
+
+    # Day (UTC midnight, NaT if unparseable): rollups carry it already,
+    # logs derive it from timestamp (or created_at). Formatting to text is
+    # left to the aggregates, which are a few hundred rows at most.
+    src = next((c for c in ["day", "timestamp", "created_at"] if c in df.columns), None)
+    if src:
+        df["day"] = pd.to_datetime(df[src], errors="coerce", utc=True, format="ISO8601").dt.normalize()
+    else:
+        df["day"] = pd.NaT
+
+    df["quantity"] = pd.to_numeric(df["quantity"], errors="coerce").fillna(0).astype("int64")
+    df["action"] = df["action"].fillna("").astype(str).str.strip().str.lower()
+    df["article_number"] = df["article_number"].fillna("").astype(str)
+    df["user_name"] = df["user_name"].fillna("").astype(str)
+    return df[MOVEMENT_COLUMNS]
+
+
+def usage_aggregates(movements, name_map=None, top_n=10):
+    """
+    top_users, top_items and daily_usage for TAKES, as lists of dicts.
+
+    The takes are filtered once and grouped once by (day, article, user);
+    the three aggregates are then folded from that (much smaller) frame.
+    """
+    name_map = name_map or {}
+    takes = movements[movements["action"] == "take"]
+    base = (
+        takes.groupby(["day", "article_number", "user_name"], sort=False, dropna=False)["quantity"]
+        .sum()
+        .reset_index()
+    )
+
+    top_users = (
+        base.groupby("user_name")["quantity"].sum()
+        .nlargest(top_n)
+        .reset_index()
+    )
+
+    top_items = (
+        base.groupby("article_number")["quantity"].sum()
+        .nlargest(top_n)
+        .reset_index()
+    )
+    top_items["product_name"] = top_items["article_number"].map(name_map).fillna("")
+    top_items = top_items[["product_name", "article_number", "quantity"]]
+
+    daily_usage = (
+        base.groupby("day")["quantity"].sum()   # NaT days are dropped here
+        .sort_index()
+        .reset_index()
+    )
+    daily_usage["day"] = daily_usage["day"].dt.strftime("%Y-%m-%d")
+
+    return {
+        "top_users": top_users.to_dict(orient="records"),
+        "top_items": top_items.to_dict(orient="records"),
+        "daily_usage": daily_usage.to_dict(orient="records"),
+    }
+
+
+def synthetic_logs(n, seed=42):
+    rnd = random.Random(seed)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    users = [f"Worker {i}" for i in range(40)]
+    articles = [str(100000 + i) for i in range(600)]
+    rows = []
+    for i in range(n):
+        ts = start + timedelta(minutes=rnd.randrange(0, 60 * 24 * 365))
+        rows.append({
+            "id": str(i),
+            "article_number": rnd.choice(articles),
+            # Sheets-era data: quantities arrive as strings, sometimes blank
+            "quantity": str(rnd.randint(1, 20)) if rnd.random() > 0.01 else "",
+            "action": rnd.choice(["take", "take", "return", "Take"]),
+            "user_name": rnd.choice(users),
+            "timestamp": ts.isoformat(),
+        })
+    return rows
+
+
+def legacy_aggregates(logs_list, name_map):
+    """The per-row implementation view_analytics used before the pipeline."""
+    def _to_int(val, default=0):
+        try:
+            if val is None:
+                return default
+            if isinstance(val, (int, float)):
+                return int(val)
+            s = str(val).strip()
+            if s == "":
+                return default
+            return int(float(s))
+        except Exception:
+            return default
+
+    def _to_date_str(s):
+        try:
+            return pd.to_datetime(s).date().isoformat()
+        except Exception:
+            return ""
+
+    logs_df = pd.DataFrame(logs_list)
+    logs_df["quantity"] = logs_df["quantity"].apply(_to_int)
+    logs_df["day"] = logs_df["timestamp"].apply(_to_date_str)
+
+    takes_df = logs_df[logs_df["action"].astype(str).str.lower() == "take"].copy()
+    top_users = (takes_df.groupby("user_name", dropna=False)["quantity"].sum()
+                 .reset_index().sort_values("quantity", ascending=False).head(10))
+
+    takes_df = logs_df[logs_df["action"].astype(str).str.lower() == "take"].copy()
+    top_items = (takes_df.groupby("article_number", dropna=False)["quantity"].sum()
+                 .reset_index().sort_values("quantity", ascending=False).head(10))
+    top_items["product_name"] = top_items["article_number"].astype(str).map(name_map).fillna("")
+
+    takes_df = logs_df[logs_df["action"].astype(str).str.lower() == "take"].copy()
+    daily_usage = (takes_df.groupby("day", dropna=False)["quantity"].sum()
+                   .reset_index().sort_values("day"))
+
+    return {
+        "top_users": top_users.to_dict(orient="records"),
+        "top_items": top_items[["product_name", "article_number", "quantity"]].to_dict(orient="records"),
+        "daily_usage": daily_usage.to_dict(orient="records"),
+    }
+
+
+def vectorized_aggregates(logs_list, name_map):
+    return usage_aggregates(prepare_movements(logs_list), name_map)
+
+
+def _best_of(func, args, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def main(n=100_000):
+    logs = synthetic_logs(n)
+    name_map = {str(100000 + i): f"Item {i}" for i in range(600)}
+
+    legacy_s, legacy = _best_of(legacy_aggregates, (logs, name_map), repeat=1)
+    vector_s, vector = _best_of(vectorized_aggregates, (logs, name_map), repeat=3)
+
+    # Same answers (order of ties aside) before comparing speed
+    assert {r["day"]: r["quantity"] for r in legacy["daily_usage"]} == \
+           {r["day"]: r["quantity"] for r in vector["daily_usage"]}
+    assert [r["quantity"] for r in legacy["top_users"]] == [r["quantity"] for r in vector["top_users"]]
+    assert [r["quantity"] for r in legacy["top_items"]] == [r["quantity"] for r in vector["top_items"]]
+
+    print(f"rows:       {n}")
+    print(f"legacy:     {legacy_s:8.3f} s")
+    print(f"vectorized: {vector_s:8.3f} s")
+    print(f"speedup:    {legacy_s / vector_s:8.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,233 @@
+# app/analytics/export_job.py
+import json
+import ast
+import os
+import threading
+from datetime import datetime, timedelta
+
+from app.google_sheets.sheets_service import (
+    DATA_ANALYTICS_COLUMNS,
+    get_projects_updated_since,
+    get_data_analytics_rows_for_projects,
+    upsert_data_analytics_rows,
+    get_sync_state,
+    set_sync_state,
+)
+
+SYNC_KEY = "data_analytics_export"
+
+_QUANTITY_COLUMNS = ("projected_quantity", "taken_quantity", "returned_quantity")
+
+# One export at a time per process (scheduler tick vs. manual button)
+_export_lock = threading.Lock()
+
+# The stored watermark trails the last exported updated_at by this many
+# seconds, so a project whose transaction committed late (with an earlier
+# updated_at) is still read on the next run; the upsert makes re-reads safe.
+WATERMARK_OVERLAP_SECONDS = int(os.getenv("DATA_ANALYTICS_WATERMARK_OVERLAP", "300"))
+
+
+def _with_overlap(watermark, since):
+    """watermark minus the overlap, never behind the watermark we started from."""
+    try:
+        trailing = (datetime.fromisoformat(watermark) - timedelta(seconds=WATERMARK_OVERLAP_SECONDS)).isoformat()
+    except (TypeError, ValueError):
+        return watermark
+    if since:
+        try:
+            if datetime.fromisoformat(trailing) < datetime.fromisoformat(since):
+                return since
+        except (TypeError, ValueError):
+            pass
+    return trailing
+
+
+def _safe_parse_json(maybe_json_str, default):
+    if not maybe_json_str:
+        return default
+    if isinstance(maybe_json_str, (list, dict)):
+        return maybe_json_str
+    s = str(maybe_json_str).strip()
+    if not s:
+        return default
+    try:
+        return json.loads(s)
+    except Exception:
+        try:
+            return ast.literal_eval(s)
+        except Exception:
+            return default
+
+
+def _to_int(x, default=0):
+    try:
+        if x is None: return default
+        s = str(x).strip()
+        return int(float(s)) if s else default
+    except Exception:
+        return default
+
+
+def _text(v):
+    return "" if v is None else str(v).strip()
+
+
+def _normalize(row):
+    """Comparable form of a data_analytics row (ignores id and type drift)."""
+    out = {}
+    for col in DATA_ANALYTICS_COLUMNS.values():
+        v = row.get(col)
+        out[col] = _to_int(v) if col in _QUANTITY_COLUMNS else _text(v)
+    return out
+
+
+def build_project_rows(proj):
+    """
+    data_analytics rows for one project: one row per article seen in
+    items / taken_by_worker / returned_by_worker.
+    """
+    # Parse JSON-like fields
+    projected = _safe_parse_json(proj.get("items"), default=[])
+    taken     = _safe_parse_json(proj.get("taken_by_worker"), default=[])
+    returned  = _safe_parse_json(proj.get("returned_by_worker"), default=[])
+    workers   = _safe_parse_json(proj.get("workers"), default=[])
+
+    # Metadata
+    order_time     = _text(proj.get("created_at"))
+    order_status   = _text(proj.get("status"))
+    warehouse      = _text(proj.get("customer_name"))
+    project_number = _text(proj.get("project_number"))
+    pickup_time    = _text(proj.get("start_date"))
+
+    # Driller
+    driller = ""
+    if isinstance(workers, list) and workers:
+        w0 = workers[0] or {}
+        driller = (w0.get("name") or w0.get("username") or "").strip()
+
+    # Aggregate quantities per item_id
+    names, proj_qty, taken_qty, returned_qty, return_types = {}, {}, {}, {}, {}
+
+    def remember_name(it):
+        iid = str(it.get("item_id", "")).strip()
+        if not iid: return
+        nm = (it.get("item_name") or "").strip()
+        if nm and not names.get(iid):
+            names[iid] = nm
+
+    if isinstance(projected, list):
+        for it in projected:
+            if not isinstance(it, dict): continue
+            iid = str(it.get("item_id", "")).strip()
+            if not iid: continue
+            remember_name(it)
+            proj_qty[iid] = proj_qty.get(iid, 0) + _to_int(it.get("quantity"), 0)
+
+    if isinstance(taken, list):
+        for it in taken:
+            if not isinstance(it, dict): continue
+            iid = str(it.get("item_id", "")).strip()
+            if not iid: continue
+            remember_name(it)
+            taken_qty[iid] = taken_qty.get(iid, 0) + _to_int(it.get("quantity"), 0)
+
+    if isinstance(returned, list):
+        for it in returned:
+            if not isinstance(it, dict): continue
+            iid = str(it.get("item_id", "")).strip()
+            if not iid: continue
+            remember_name(it)
+            q = _to_int(it.get("quantity"), 0)
+            returned_qty[iid] = returned_qty.get(iid, 0) + q
+            rtype = (it.get("return_type") or "").strip().lower()
+            if rtype:
+                rtmap = return_types.setdefault(iid, {})
+                rtmap[rtype] = rtmap.get(rtype, 0) + q
+
+    rows = []
+    for iid in sorted(set(proj_qty) | set(taken_qty) | set(returned_qty)):
+        # Comment summarizing return categories
+        comment = "; ".join(f"{k}:{v}" for k, v in return_types.get(iid, {}).items())
+        rows.append({
+            "article_number": iid,
+            "order_time": order_time,
+            "order_status": order_status,
+            "warehouse": warehouse,
+            "driller": driller,
+            "project_number": project_number,
+            "pickup_time": pickup_time,
+            "item_name": names.get(iid, ""),
+            "projected_quantity": proj_qty.get(iid, 0),
+            "taken_quantity": taken_qty.get(iid, 0),
+            "returned_quantity": returned_qty.get(iid, 0),
+            "comments": comment,
+        })
+    return rows
+
+
+def export_projects_to_data_analytics(full=False):
+    """
+    Incremental UPSERT export from 'projects' to 'data_analytics'.
+
+    - Only projects with updated_at >= the stored watermark are read
+      (all projects when full=True or on the first run); the watermark is
+      stored WATERMARK_OVERLAP_SECONDS behind the newest exported change
+    - Key: (Article Number, Project number, Order time)
+    - If key exists and values differ: update the row
+    - If key missing: insert a new row
+    - If key exists and values are identical: skip
+    - Inserts and updates are sent as chunked bulk upserts on the key
+
+    Returns: (appended_count, updated_count, skipped_count)
+    """
+    with _export_lock:
+        state = None if full else get_sync_state(SYNC_KEY)
+        since = (state or {}).get("watermark") or None
+
+        projects = get_projects_updated_since(since)
+        if not projects:
+            set_sync_state(SYNC_KEY, since, {"appended": 0, "updated": 0, "skipped": 0, "projects": 0})
+            return 0, 0, 0
+
+        # Existing rows, only for the projects that changed
+        existing_map = {}
+        for row in get_data_analytics_rows_for_projects([p.get("project_number") for p in projects]):
+            key = (_text(row.get("article_number")), _text(row.get("project_number")), _text(row.get("order_time")))
+            existing_map[key] = row
+
+        appended = 0
+        updated  = 0
+        skipped  = 0
+        watermark = since
+        # key -> row; a later project with the same key wins, as with row-by-row writes
+        pending = {}
+
+        for proj in projects:
+            for new_row in build_project_rows(proj):
+                key = (new_row["article_number"], new_row["project_number"], new_row["order_time"])
+                old_row = existing_map.get(key)
+                if old_row is None:
+                    if key not in pending:
+                        appended += 1
+                    pending[key] = new_row
+                    existing_map[key] = new_row
+                elif _normalize(old_row) != _normalize(new_row):
+                    updated += 1
+                    pending[key] = new_row
+                    existing_map[key] = new_row
+                else:
+                    skipped += 1
+
+            # Projects arrive oldest change first, so this only moves forward
+            watermark = _text(proj.get("updated_at")) or watermark
+
+        # Inserts and updates go out together as chunked bulk upserts
+        upsert_data_analytics_rows(list(pending.values()))
+
+        set_sync_state(SYNC_KEY, _with_overlap(watermark, since), {
+            "appended": appended,
+            "updated": updated,
+            "skipped": skipped,
+            "projects": len(projects),
+        })
+        return appended, updated, skipped
@@ -0,0 +1,75 @@
+# app/analytics/pipeline.py
+"""
+Vectorized computations for the analytics page: issue counts per item and
+the low-stock list. Usage totals are grouped in the database instead
+(get_usage_totals()).
+"""
+import pandas as pd
+
+
+def issue_counts(issue_rows, top_n=10):
+    """Per-item count of issue reports (rows or a frame), most reported first."""
+    if isinstance(issue_rows, pd.DataFrame):
+        df = issue_rows
+    else:
+        df = pd.DataFrame.from_records(issue_rows or [])
+    if df.empty:
+        return []
+    # Normalize a couple of common variants
+    df = df.rename(columns={"Article Number": "article_number", "Item name": "product_name"})
+    group_cols = [c for c in ["product_name", "article_number"] if c in df.columns]
+    if not group_cols:
+        return []
+    counts = (
+        df[group_cols].fillna("").astype(str)
+        .value_counts()
+        .head(top_n)
+        .rename("issue_count")
+        .reset_index()
+    )
+    return counts.to_dict(orient="records")
+
+
+def low_stock(products, reorder_rows=None):
+    """
+    Items where stock < safety_stock, largest deficit first.
+
+    `reorder_rows` (from 'reorder_points') add days_of_cover and the
+    suggested reorder_point to each item when present.
+    """
+    df = pd.DataFrame.from_records(products or [])
+    if df.empty or "safety_stock" not in df.columns:
+        return []
+
+    article = df.get("article_number", pd.Series("", index=df.index)).fillna("").astype(str)
+    name = df.get("product_name", pd.Series("", index=df.index)).fillna("")
+    if "product_description" in df.columns:
+        name = name.where(name != "", df["product_description"].fillna(""))
+    stock = pd.to_numeric(df.get("stock", pd.Series(0, index=df.index)), errors="coerce").fillna(0).astype("int64")
+    safety = pd.to_numeric(df["safety_stock"], errors="coerce").fillna(0).astype("int64")
+    flag = df.get("delivery_on_the_way", pd.Series("", index=df.index)).fillna("").astype(str).str.strip().str.lower()
+
+    out = pd.DataFrame({
+        "article_number": article,
+        "product_name": name.astype(str),
+        "stock_int": stock,
+        "safety_stock_int": safety,
+        "deficit": (safety - stock).clip(lower=0),
+        "delivery_on_the_way": flag.isin(["true", "1", "yes", "y"]),
+    })
+    out = out[(out["safety_stock_int"] > 0) & (out["stock_int"] < out["safety_stock_int"])]
+    out = out.sort_values(["deficit", "safety_stock_int"], ascending=[False, True])
+
+    reorder = pd.DataFrame.from_records(reorder_rows or [])
+    if not reorder.empty and "article_number" in reorder.columns:
+        reorder = reorder.drop_duplicates("article_number").set_index("article_number")
+        for col in ["days_of_cover", "reorder_point", "needs_reorder"]:
+            if col in reorder.columns:
+                out[col] = out["article_number"].map(reorder[col])
+        if "reorder_point" in out.columns:
+            out["reorder_point"] = pd.to_numeric(out["reorder_point"], errors="coerce").round().astype("Int64")
+    for col in ["days_of_cover", "reorder_point", "needs_reorder"]:
+        if col not in out.columns:
+            out[col] = None
+    out = out.astype(object).where(out.notna(), None)
+    return out.to_dict(orient="records")
@@ -0,0 +1,128 @@
+# app/analytics/reorder.py
+"""
+Batch reorder-point engine.
+
+For every article in 'products', from the TAKES in 'usage_daily_rollup'
+over the last `window_days` (summed per article in the database, see
+get_article_usage_stats()):
+
+    daily_rate     mean units taken per day (days without takes count as 0)
+    daily_std      standard deviation of the daily takes
+    days_of_cover  stock / daily_rate
+    safety_stock   z * daily_std * sqrt(lead_time_days)
+    reorder_point  daily_rate * lead_time_days + safety_stock
+
+Articles with a delivery on the way are never flagged for reorder.
+Everything is computed in one vectorized pass; results go to 'reorder_points'.
+"""
+import math
+import os
+import time
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+from app.google_sheets.sheets_service import (
+    get_all_items, get_pending_delivery_articles, get_article_usage_stats,
+    upsert_reorder_points, set_sync_state,
+)
+
+SYNC_KEY = "reorder_points"
+
+
+def _env_number(name, default, cast=int):
+    try:
+        return cast(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def compute_reorder_points(usage_stats, products, pending_articles=(),
+                           window_days=90, lead_time_days=14, service_z=1.65):
+    """
+    Reorder rows (list of dicts) for every article in `products`.
+
+    `usage_stats` are the per-article takes inside the window:
+    {article_number, total, total_sq}, where total_sq is the sum of the
+    squared daily totals (zero days add nothing to either sum).
+    """
+    stats = pd.DataFrame.from_records(usage_stats or [], columns=["article_number", "total", "total_sq"])
+    stats["article_number"] = stats["article_number"].fillna("").astype(str).str.strip()
+    stats = stats.set_index("article_number")
+    total = pd.to_numeric(stats["total"], errors="coerce").fillna(0)
+    total_sq = pd.to_numeric(stats["total_sq"], errors="coerce").fillna(0)
+
+    df = pd.DataFrame.from_records(products or [])
+    if df.empty or "article_number" not in df.columns:
+        return []
+    df["article_number"] = df["article_number"].fillna("").astype(str).str.strip()
+    df = df[df["article_number"] != ""].drop_duplicates("article_number")
+    article = df["article_number"]
+    stock = pd.to_numeric(df.get("stock", pd.Series(0, index=df.index)), errors="coerce").fillna(0)
+
+    n = float(window_days)
+    rate = article.map(total).fillna(0).astype("float64") / n
+    mean_sq = article.map(total_sq).fillna(0).astype("float64") / n
+    variance = (mean_sq - rate ** 2).clip(lower=0) * (n / (n - 1) if n > 1 else 1.0)
+    std = np.sqrt(variance)
+
+    safety = np.ceil(service_z * std * math.sqrt(lead_time_days))
+    reorder_point = np.ceil(rate * lead_time_days + safety)
+    days_of_cover = (stock / rate).where(rate > 0)
+    pending = article.isin(set(pending_articles or ()))
+
+    out = pd.DataFrame({
+        "article_number": article,
+        "stock": stock.astype("int64"),
+        "daily_rate": rate.round(4),
+        "daily_std": std.round(4),
+        "days_of_cover": days_of_cover.round(1),
+        "safety_stock": safety.astype("int64"),
+        "reorder_point": reorder_point.astype("int64"),
+        "pending_delivery": pending,
+        "needs_reorder": (reorder_point > 0) & (stock <= reorder_point) & ~pending,
+        "window_days": window_days,
+        "lead_time_days": lead_time_days,
+    })
+    # NaN is not valid JSON for the API
+    out["days_of_cover"] = out["days_of_cover"].astype(object).where(out["days_of_cover"].notna(), None)
+    return out.to_dict(orient="records")
+
+
+def run_reorder_points():
+    """
+    Recompute 'reorder_points' for the whole catalog.
+
+    Window, lead time and service level come from REORDER_WINDOW_DAYS (90),
+    REORDER_LEAD_TIME_DAYS (14) and REORDER_SERVICE_Z (1.65).
+    Returns (articles, flagged).
+    """
+    started = time.monotonic()
+    window_days = max(_env_number("REORDER_WINDOW_DAYS", 90), 1)
+    lead_time_days = max(_env_number("REORDER_LEAD_TIME_DAYS", 14), 1)
+    service_z = _env_number("REORDER_SERVICE_Z", 1.65, float)
+
+    today = date.today()
+    usage_stats = get_article_usage_stats((today - timedelta(days=window_days - 1)).isoformat(), "take")
+    rows = compute_reorder_points(
+        usage_stats,
+        get_all_items(),
+        get_pending_delivery_articles(),
+        window_days=window_days,
+        lead_time_days=lead_time_days,
+        service_z=service_z,
+    )
+
+    computed_at = datetime.now(timezone.utc).isoformat()
+    for row in rows:
+        row["computed_at"] = computed_at
+    upsert_reorder_points(rows)
+
+    flagged = sum(1 for row in rows if row["needs_reorder"])
+    set_sync_state(SYNC_KEY, computed_at, {
+        "articles": len(rows),
+        "needs_reorder": flagged,
+        "seconds": round(time.monotonic() - started, 2),
+    })
+    return len(rows), flagged
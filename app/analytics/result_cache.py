@@ -0,0 +1,73 @@
+# app/analytics/result_cache.py
+"""
+Result cache for derived (read-only) views.
+
+A cached result is keyed on the view name, its parameters and a watermark
+of every source table it reads: (row count, max timestamp). Checking the
+watermarks costs one tiny query per table; the result is recomputed only
+when one of them moved.
+"""
+import threading
+from collections import OrderedDict
+
+from app.google_sheets.sheets_service import get_table_watermark
+
+# Source table -> column whose max() moves on every write
+LOGS = ("logs", "timestamp")
+PRODUCTS = ("products", "updated_at")
+ISSUE_REPORTS = ("issue_reports", "timestamp")
+REORDER_POINTS = ("reorder_points", "computed_at")
+USAGE_ROLLUP = ("usage_daily_rollup", "updated_at")
+
+
+class ResultCache:
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, view, params, sources, compute):
+        """
+        Return compute() for (view, params), reusing the last result while
+        the watermarks of `sources` are unchanged.
+        """
+        watermarks = tuple(get_table_watermark(table, col) for table, col in sources)
+        key = (view, tuple(sorted((params or {}).items())))
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == watermarks:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        # Compute outside the lock; concurrent misses just compute twice
+        result = compute()
+
+        with self._lock:
+            self._entries[key] = (watermarks, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+            }
+
+
+# Shared by the analytics, user stats and logs views
+result_cache = ResultCache()
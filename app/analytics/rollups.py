@@ -0,0 +1,35 @@
+# app/analytics/rollups.py
+from datetime import date, datetime, timedelta, timezone
+
+from app.google_sheets.sheets_service import iter_table_rows, rebuild_usage_rollup
+
+
+def _first_log_day():
+    first = next(iter_table_rows("logs_all", ["timestamp"], page_size=1), None)
+    if not first:
+        return None
+    return date.fromisoformat(str(first["timestamp"])[:10])
+
+
+def backfill_usage_rollups():
+    """
+    Rebuild 'usage_daily_rollup' from the full logs history (hot and
+    archived), one month per call to rebuild_usage_rollup(), which
+    aggregates in the database (app/supabase/022).
+
+    Each month is replaced with absolute totals, so the backfill is
+    idempotent and can be re-run to repair drift. Returns the number of
+    rollup rows written.
+    """
+    start = _first_log_day()
+    if start is None:
+        return 0
+    today = datetime.now(timezone.utc).date()
+
+    written = 0
+    month = start.replace(day=1)
+    while month <= today:
+        next_month = (month + timedelta(days=32)).replace(day=1)
+        written += rebuild_usage_rollup(month.isoformat(), (next_month - timedelta(days=1)).isoformat())
+        month = next_month
+    return written
@@ -0,0 +1,406 @@
+# app/analytics/snapshots.py
+"""
+Columnar snapshot store for historical movements.
+
+'logs' (hot and archived), 'issue_reports' and the project movement lines
+are copied into Parquet files partitioned by month, so heavy analytics read
+them from disk (or the storage bucket) instead of pulling raw rows from the
+database:
+
+    <dataset>/month=YYYY-MM/data.parquet              compacted up to yesterday
+    <dataset>/month=YYYY-MM/day=YYYY-MM-DD.parquet    today's increments
+
+compact_snapshots()   nightly: moves everything up to yesterday into the
+                      month files (watermark in sync_state)
+append_snapshots()    intraday: appends the rows added today since the last run
+load_snapshot()       pandas frame with only the needed columns and months
+load_history()        the compacted snapshot plus the newer rows from the
+                      database: complete and current (the analytics page's
+                      issue counts read it)
+
+Late writes: each compaction re-reads the last SNAPSHOT_REFOLD_DAYS days
+(default 7) before its watermark, so rows inserted with a recent backdated
+timestamp or edited within that window replace their snapshot copy (rows
+are matched on id). Older backdated inserts, edits and deletes only reach
+the snapshot with `flask compact-snapshots --full`, which rewrites it.
+
+Project movements have no timestamps of their own; they are rewritten in
+full by compact_snapshots(), partitioned by the project's start month.
+Log and issue rows without a timestamp are left out of the snapshots (the
+exports still include them, see iter_table_rows()).
+
+SNAPSHOT_BUCKET selects a storage bucket; otherwise files go to SNAPSHOT_DIR
+(default ./snapshots). Needs pyarrow.
+"""
+import io
+import json
+import os
+from datetime import date, datetime, timedelta, timezone
+
+import pandas as pd
+
+from app.google_sheets.sheets_service import (
+    iter_table_rows, get_projects_with_status, get_sync_state, set_sync_state,
+    put_storage_object, get_storage_object, list_storage_objects, remove_storage_objects,
+)
+
+PROJECT_MOVEMENTS = "project_movements"
+
+# dataset -> source table, timestamp column, numeric columns, row key
+SNAPSHOT_DATASETS = {
+    "logs": {"table": "logs_all", "ts": "timestamp", "numeric": ("quantity",), "key": "id"},
+    "issue_reports": {"table": "issue_reports", "ts": "timestamp", "numeric": ("count",), "key": "id"},
+    PROJECT_MOVEMENTS: {"table": None, "ts": "start_on", "numeric": ("quantity",), "key": None},
+}
+
+MONTH_FILE = "data.parquet"
+UNDATED = "undated"
+
+SNAPSHOT_REFOLD_DAYS = int(os.getenv("SNAPSHOT_REFOLD_DAYS", "7"))
+
+
+def _parquet():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("Parquet snapshots need pyarrow (pip install pyarrow)") from e
+    return pa, pq
+
+
+# ---------- Stores ----------
+class LocalStore:
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, path):
+        return os.path.join(self.root, *path.split("/"))
+
+    def read(self, path):
+        try:
+            with open(self._path(path), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def write(self, path, data):
+        full = self._path(path)
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        tmp = f"{full}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, full)  # readers never see a half-written file
+
+    def list(self, folder):
+        try:
+            return sorted(n for n in os.listdir(self._path(folder)) if not n.endswith(".tmp"))
+        except FileNotFoundError:
+            return []
+
+    def remove(self, paths):
+        for path in paths:
+            try:
+                os.remove(self._path(path))
+            except FileNotFoundError:
+                pass
+
+
+class BucketStore:
+    def __init__(self, bucket):
+        self.bucket = bucket
+
+    def read(self, path):
+        return get_storage_object(self.bucket, path)
+
+    def write(self, path, data):
+        put_storage_object(self.bucket, path, data)
+
+    def list(self, folder):
+        return sorted(list_storage_objects(self.bucket, folder))
+
+    def remove(self, paths):
+        remove_storage_objects(self.bucket, list(paths))
+
+
+def get_snapshot_store():
+    bucket = os.getenv("SNAPSHOT_BUCKET", "").strip()
+    if bucket:
+        return BucketStore(bucket)
+    return LocalStore(os.getenv("SNAPSHOT_DIR", "snapshots"))
+
+
+# ---------- Frames & files ----------
+def _text(v):
+    if v is None:
+        return None
+    if isinstance(v, (dict, list)):
+        return json.dumps(v, ensure_ascii=False)
+    return str(v)
+
+
+def _frame(rows, spec):
+    """Typed frame: UTC timestamps, nullable integers, everything else text."""
+    df = pd.DataFrame.from_records(list(rows))
+    if df.empty:
+        return df
+    for col in df.columns:
+        if col == spec["ts"]:
+            df[col] = pd.to_datetime(df[col], errors="coerce", utc=True, format="ISO8601")
+        elif col in spec["numeric"]:
+            df[col] = pd.to_numeric(df[col], errors="coerce").round().astype("Int64")
+        else:
+            df[col] = df[col].map(_text).astype(object)
+    return df
+
+
+def _write(store, path, df):
+    pa, pq = _parquet()
+    sink = io.BytesIO()
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), sink, compression="zstd")
+    store.write(path, sink.getvalue())
+
+
+def _read(store, path, columns=None):
+    data = store.read(path)
+    if data is None:
+        return pd.DataFrame()
+    pa, pq = _parquet()
+    pf = pq.ParquetFile(io.BytesIO(data))
+    if columns is not None:
+        columns = [c for c in columns if c in pf.schema_arrow.names]
+    return pf.read(columns=columns).to_pandas()
+
+
+def _combine(frames, spec):
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame()
+    df = pd.concat(frames, ignore_index=True)
+    if spec["key"] and spec["key"] in df.columns:
+        df = df.drop_duplicates(spec["key"], keep="last")
+    order = [c for c in (spec["ts"], spec["key"]) if c and c in df.columns]
+    return df.sort_values(order, kind="stable").reset_index(drop=True) if order else df
+
+
+def _month_dir(name, month):
+    return f"{name}/month={month}"
+
+
+def _day_file(day):
+    return f"day={day.isoformat()}.parquet"
+
+
+def _months(start, end):
+    """First day of every month from start's month through end's month."""
+    month = start.replace(day=1)
+    while month <= end:
+        yield month
+        month = (month + timedelta(days=32)).replace(day=1)
+
+
+def _utc_today():
+    return datetime.now(timezone.utc).date()
+
+
+# ---------- Nightly compaction ----------
+def _compact_table(store, name, spec, full=False):
+    """
+    Fold every full day since the watermark (and the SNAPSHOT_REFOLD_DAYS
+    before it) into its month file; returns rows read. With `full`, every
+    month is rebuilt from the table alone.
+    """
+    key = f"snapshot:{name}"
+    yesterday = _utc_today() - timedelta(days=1)
+
+    state = {} if full else (get_sync_state(key) or {})
+    if state.get("watermark"):
+        start = date.fromisoformat(state["watermark"]) + timedelta(days=1 - SNAPSHOT_REFOLD_DAYS)
+    else:
+        first = next(iter_table_rows(spec["table"], [spec["ts"]], page_size=1), None)
+        first_ts = _frame([first], spec)[spec["ts"]].iloc[0] if first else pd.NaT
+        if pd.isna(first_ts):
+            return 0
+        start = first_ts.date()
+
+    added = 0
+    for month in _months(start, yesterday):
+        lo = max(start, month)
+        hi = min((month + timedelta(days=32)).replace(day=1) - timedelta(days=1), yesterday)
+        folder = _month_dir(name, month.strftime("%Y-%m"))
+
+        new = _frame(iter_table_rows(spec["table"], date_from=lo.isoformat(), date_to=hi.isoformat()), spec)
+        path = f"{folder}/{MONTH_FILE}"
+        if full:
+            # Whole month re-read: drop what the table no longer has
+            if new.empty:
+                store.remove([path])
+            else:
+                _write(store, path, _combine([new], spec))
+            added += len(new)
+        elif not new.empty:
+            _write(store, path, _combine([_read(store, path), new], spec))
+            added += len(new)
+
+        # Those days are in the month file now; drop their increments
+        done = {_day_file(lo + timedelta(days=i)) for i in range((hi - lo).days + 1)}
+        store.remove(f"{folder}/{n}" for n in store.list(folder) if n in done)
+        set_sync_state(key, hi.isoformat(), {"month": month.strftime("%Y-%m"), "rows": len(new)})
+    return added
+
+
+def _movement_lines(project):
+    for kind, column in (("taken", "taken_by_worker"), ("returned", "returned_by_worker")):
+        lines = project.get(column)
+        if isinstance(lines, str):
+            try:
+                lines = json.loads(lines or "[]")
+            except ValueError:
+                lines = []
+        for line in lines if isinstance(lines, list) else []:
+            if not isinstance(line, dict):
+                continue
+            quantity = pd.to_numeric(line.get("quantity"), errors="coerce")
+            yield {
+                "project_id": project.get("id"),
+                "project_number": project.get("project_number"),
+                "start_on": project.get("start_on"),
+                "kind": kind,
+                "article_number": str(line.get("item_id") or "").strip(),
+                "item_name": line.get("item_name") or "",
+                # same rule as _line_qty(): a line without a quantity counts as one
+                "quantity": 1 if pd.isna(quantity) else int(quantity),
+                "return_type": (line.get("return_type") or "").strip().lower(),
+            }
+
+
+def _snapshot_project_movements(store):
+    """Rewrite the project movement partitions from the projects; returns lines written."""
+    spec = SNAPSHOT_DATASETS[PROJECT_MOVEMENTS]
+    projects = get_projects_with_status(columns="id, project_number, start_on, taken_by_worker, returned_by_worker")
+    df = _frame((line for p in projects for line in _movement_lines(p)), spec)
+
+    months = set()
+    if not df.empty:
+        month = df["start_on"].dt.strftime("%Y-%m").fillna(UNDATED)
+        for value, part in df.groupby(month, sort=True):
+            _write(store, f"{_month_dir(PROJECT_MOVEMENTS, value)}/{MONTH_FILE}", part)
+            months.add(value)
+
+    # Months no project starts in any more
+    stale = [n for n in store.list(PROJECT_MOVEMENTS) if n.split("=", 1)[-1] not in months]
+    store.remove(f"{PROJECT_MOVEMENTS}/{n}/{MONTH_FILE}" for n in stale)
+    set_sync_state(f"snapshot:{PROJECT_MOVEMENTS}", _utc_today().isoformat(), {"rows": len(df)})
+    return len(df)
+
+
+def compact_snapshots(store=None, full=False):
+    """Nightly job: {dataset: rows written}. `full` rebuilds every month."""
+    _parquet()
+    store = store or get_snapshot_store()
+    out = {}
+    for name, spec in SNAPSHOT_DATASETS.items():
+        if spec["table"]:
+            out[name] = _compact_table(store, name, spec, full=full)
+    out[PROJECT_MOVEMENTS] = _snapshot_project_movements(store)
+    return out
+
+
+# ---------- Intraday increments ----------
+def append_snapshots(store=None):
+    """Append the rows added today (UTC) since the last run: {dataset: rows appended}."""
+    _parquet()
+    store = store or get_snapshot_store()
+    today = _utc_today()
+    out = {}
+    for name, spec in SNAPSHOT_DATASETS.items():
+        if not spec["table"]:
+            continue
+        path = f"{_month_dir(name, today.strftime('%Y-%m'))}/{_day_file(today)}"
+        old = _read(store, path)
+
+        # Resume after the newest dated row; a NaT has no place in the cursor
+        after = None
+        dated = old[old[spec["ts"]].notna()] if not old.empty else old
+        if not dated.empty:
+            last = dated.iloc[-1]
+            after = (last[spec["ts"]].isoformat(), str(last[spec["key"]]))
+
+        new = _frame(iter_table_rows(spec["table"], date_from=today.isoformat(), after=after), spec)
+        if not new.empty:
+            _write(store, path, _combine([old, new], spec))
+        out[name] = len(new)
+    return out
+
+
+# ---------- Reading ----------
+def load_snapshot(name, columns=None, date_from=None, date_to=None, store=None):
+    """
+    DataFrame of one dataset from the snapshot files, reading only `columns`
+    and the month partitions (and day files) that overlap date_from..date_to
+    (ISO dates, inclusive, on the dataset's timestamp column).
+    """
+    spec = SNAPSHOT_DATASETS[name]
+    store = store or get_snapshot_store()
+    ts = spec["ts"]
+    lo = date.fromisoformat(date_from) if date_from else None
+    hi = date.fromisoformat(date_to) if date_to else None
+
+    read_columns = None
+    if columns:
+        read_columns = list(dict.fromkeys(list(columns) + [c for c in (ts, spec["key"]) if c]))
+
+    frames = []
+    for folder in store.list(name):
+        month = folder.split("=", 1)[-1]
+        if month == UNDATED:
+            if lo or hi:
+                continue
+        elif (lo and month < lo.strftime("%Y-%m")) or (hi and month > hi.strftime("%Y-%m")):
+            continue
+
+        for file_name in store.list(f"{name}/{folder}"):
+            if file_name.startswith("day="):
+                day = file_name[len("day="):-len(".parquet")]
+                if (lo and day < lo.isoformat()) or (hi and day > hi.isoformat()):
+                    continue
+            elif file_name != MONTH_FILE:
+                continue
+            frames.append(_read(store, f"{name}/{folder}/{file_name}", read_columns))
+
+    df = _combine(frames, spec)
+    if df.empty:
+        return pd.DataFrame(columns=list(columns or []))
+    if lo:
+        df = df[df[ts] >= pd.Timestamp(lo, tz="UTC")]
+    if hi:
+        df = df[df[ts] < pd.Timestamp(hi + timedelta(days=1), tz="UTC")]
+    if columns:
+        df = df[[c for c in columns if c in df.columns]]
+    return df.reset_index(drop=True)
+
+
+def load_history(name, columns=None, store=None):
+    """
+    Every dated row of a table-backed dataset: the snapshot up to the
+    compaction watermark, then the rows after it straight from the
+    database (keyset paged, usually a day or two). Without a compacted
+    snapshot yet, everything comes from the database.
+    """
+    spec = SNAPSHOT_DATASETS[name]
+    state = get_sync_state(f"snapshot:{name}") or {}
+    watermark = state.get("watermark")
+
+    frames = []
+    tail_from = None
+    if watermark:
+        frames.append(load_snapshot(name, columns, date_to=watermark, store=store))
+        tail_from = (date.fromisoformat(watermark) + timedelta(days=1)).isoformat()
+    frames.append(_frame(iter_table_rows(spec["table"], list(columns) if columns else None,
+                                         ts_column=spec["ts"], date_from=tail_from), spec))
+
+    # The two parts cover disjoint days, so no de-duplication is needed
+    frames = [f for f in frames if not f.empty]
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    if columns:
+        df = df.reindex(columns=list(columns))
+    return df
@@ -0,0 +1,43 @@
+# app/events/__init__.py
+"""
+In-app event bus: stock changes and safety-stock crossings, streamed to the
+browser over SSE.
+
+    from app.events import publish
+    publish("stock_changed", {...})
+
+EVENTS_BACKEND selects the broker: "local" (default, single process) or
+"redis" (needs the redis package and REDIS_URL).
+"""
+import os
+import threading
+
+from app.events.broker import Broker, LocalBroker, RedisBroker
+
+STOCK_CHANGED = "stock_changed"
+SAFETY_THRESHOLD_CROSSED = "safety_threshold_crossed"
+MOVEMENTS_CONFIRMED = "movements_confirmed"
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker() -> Broker:
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            backend = os.getenv("EVENTS_BACKEND", "local").strip().lower()
+            if backend == "redis":
+                _broker = RedisBroker(os.environ["REDIS_URL"])
+            else:
+                _broker = LocalBroker()
+        return _broker
+
+
+def publish(event, data):
+    """Publish an event; never raises, a broken bus must not fail a stock update."""
+    try:
+        return get_broker().publish(event, data)
+    except Exception as e:
+        print(f"⚠️ Could not publish '{event}':", e)
+        return None
@@ -0,0 +1,113 @@
+# app/events/broker.py
+"""
+Event brokers for the SSE stream (see app/routes/shared/event_stream.py).
+
+Every event gets an increasing id so a reconnecting client can send
+Last-Event-ID and receive what it missed, as long as it is still in the
+broker's history.
+
+LocalBroker keeps that history in memory and only reaches subscribers in the
+same process. With several gunicorn workers use RedisBroker
+(EVENTS_BACKEND=redis, REDIS_URL=...), which keeps it in a Redis stream.
+"""
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+
+
+class Broker(ABC):
+    """Interface: publish() from any thread, listen() from the SSE response."""
+
+    @abstractmethod
+    def publish(self, event, data):
+        """Store and fan out one event; returns its id."""
+
+    @abstractmethod
+    def listen(self, last_event_id=None, timeout=15.0):
+        """
+        Yield (id, event, data) for events after `last_event_id`, blocking
+        for new ones. Yields None every `timeout` seconds without events so
+        the caller can send a heartbeat (and notice a closed connection).
+        """
+
+
+class LocalBroker(Broker):
+    def __init__(self, history=1000):
+        self._history = deque(maxlen=history)
+        self._cond = threading.Condition()
+        # Millisecond base keeps ids increasing across restarts
+        self._next_id = int(time.time() * 1000)
+
+    def publish(self, event, data):
+        with self._cond:
+            self._next_id += 1
+            self._history.append((str(self._next_id), event, data))
+            self._cond.notify_all()
+        return str(self._next_id)
+
+    def _after(self, last_id):
+        # Caller holds the lock
+        if last_id is None:
+            return []
+        return [e for e in self._history if int(e[0]) > last_id]
+
+    def listen(self, last_event_id=None, timeout=15.0):
+        try:
+            last_id = int(last_event_id) if last_event_id else None
+        except ValueError:
+            last_id = None
+
+        with self._cond:
+            if last_id is None:
+                # New client: only events from now on
+                last_id = int(self._history[-1][0]) if self._history else self._next_id
+
+        while True:
+            with self._cond:
+                pending = self._after(last_id)
+                if not pending:
+                    self._cond.wait(timeout)
+                    pending = self._after(last_id)
+            if not pending:
+                yield None
+                continue
+            for entry in pending:
+                last_id = int(entry[0])
+                yield entry
+
+
+class RedisBroker(Broker):
+    """Events in a capped Redis stream, shared by every worker."""
+
+    def __init__(self, url, stream="wms:events", history=1000):
+        import redis  # optional dependency, only needed for this backend
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self._stream = stream
+        self._history = history
+
+    def publish(self, event, data):
+        return self._redis.xadd(
+            self._stream,
+            {"event": event, "data": json.dumps(data, default=str)},
+            maxlen=self._history,
+            approximate=True,
+        )
+
+    def _latest_id(self):
+        # Concrete id of the newest entry ("0-0" for an empty stream); "$"
+        # would be re-resolved on every read and skip what came in between
+        newest = self._redis.xrevrange(self._stream, count=1)
+        return newest[0][0] if newest else "0-0"
+
+    def listen(self, last_event_id=None, timeout=15.0):
+        last_id = last_event_id or self._latest_id()
+        while True:
+            result = self._redis.xread({self._stream: last_id}, block=int(timeout * 1000), count=100)
+            if not result:
+                yield None
+                continue
+            for entry_id, fields in result[0][1]:
+                last_id = entry_id
+                yield entry_id, fields.get("event"), json.loads(fields.get("data") or "null")
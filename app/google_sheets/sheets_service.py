@@ -1,12 +1,17 @@
 # supabase_backend.py
 import os
+import ast
 import csv
+import json
 import uuid
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from typing import List, Dict, Any, Optional, Tuple
 
 from supabase import create_client, Client
 
+from app import events
+from app.google_sheets.cache import TTLCache
+
 # ---------- Supabase client ----------
 SUPABASE_URL = os.environ["SUPABASE_URL"]
 SUPABASE_KEY = os.environ.get("SUPABASE_SERVICE_ROLE_KEY") or os.environ["SUPABASE_ANON_KEY"]
@@ -26,6 +31,20 @@ def _single(res):
         return data[0]
     return data
 
+def get_table_watermark(table: str, ts_column: str) -> Tuple[int, Optional[str]]:
+    """
+    Cheap change marker for a table: (row count, max(ts_column)).
+    Any insert, delete or touched row moves at least one of the two.
+    Rows without a ts_column still count; they sort last so the max is
+    the newest real value.
+    """
+    r = sb.table(table).select(ts_column, count="exact") \
+          .order(ts_column, desc=True, nullsfirst=False).limit(1).execute()
+    if r.error:
+        raise RuntimeError(r.error.message)
+    latest = r.data[0].get(ts_column) if r.data else None
+    return r.count or 0, latest
+
 def _ensure_int(v, default=0) -> int:
     try:
         if v is None:
@@ -62,10 +81,94 @@ def get_user_by_id(user_id: str) -> Optional[Dict[str, Any]]:
     res = sb.table("users").select("*").eq("id", user_id).limit(1).execute()
     return _single(res)
 
+def get_users_by_ids(user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """id -> current row (not cached), for forms that send updated_at back as the version."""
+    ids = sorted({str(i) for i in user_ids if i})
+    if not ids:
+        return {}
+    res = sb.table("users").select("*").in_("id", ids).execute()
+    if res.error:
+        raise RuntimeError(res.error.message)
+    return {str(u.get("id")): u for u in res.data or []}
+
 def get_user_by_name_and_pin(name: str, pin: str) -> Optional[Dict[str, Any]]:
     res = sb.table("users").select("*").eq("name", name).eq("pin", pin).limit(1).execute()
     return _single(res)
 
+# ---------- User directory (cached) ----------
+# Every user, indexed by id and by role, cached for USER_DIRECTORY_TTL
+# seconds and dropped by add_user() / update_user() / CSV imports. Writes
+# from outside the app only show after the TTL, so edit forms take the
+# row and its version from get_users_by_ids() instead.
+_user_directory = TTLCache(ttl=float(os.environ.get("USER_DIRECTORY_TTL", "300")), max_entries=1)
+
+def _load_user_directory() -> Dict[str, Any]:
+    users = sorted(get_all_users(), key=lambda u: (str(u.get("name") or "").lower(), str(u.get("id"))))
+    by_role: Dict[str, List[Dict[str, Any]]] = {}
+    for u in users:
+        by_role.setdefault(str(u.get("role") or "").strip().lower(), []).append(u)
+    return {"users": users, "by_id": {str(u.get("id")): u for u in users}, "by_role": by_role}
+
+def invalidate_user_directory():
+    _user_directory.invalidate()
+
+def list_users(role: Optional[str] = None, search: str = "", limit: Optional[int] = None,
+               offset: int = 0, include_pin: bool = False) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Users from the cached directory, optionally one role and/or matching
+    `search` in name or email, ordered by name. Returns (page, total).
+    """
+    directory = _user_directory.get_or_load("users", _load_user_directory)
+    users = directory["by_role"].get(role.strip().lower(), []) if role else directory["users"]
+
+    term = (search or "").strip().lower()
+    if term:
+        users = [u for u in users
+                 if term in str(u.get("name") or "").lower() or term in str(u.get("email") or "").lower()]
+
+    total = len(users)
+    offset = max(0, int(offset))
+    page = users[offset:offset + int(limit)] if limit is not None else users[offset:]
+    if not include_pin:
+        page = [{k: v for k, v in u.items() if k != "pin"} for u in page]
+    return page, total
+
+def add_user(name: str, email: str, pin: str, role: str) -> Dict[str, Any]:
+    payload = {
+        "id": str(uuid.uuid4()),
+        "created_at": _utcnow_iso(),
+        "name": name,
+        "email": (email or "").strip().lower(),
+        "pin": pin,
+        "role": role,
+    }
+    row = _single(sb.table("users").insert(payload).execute())
+    invalidate_user_directory()
+    return row
+
+USER_EDITABLE_FIELDS = ("name", "email", "role", "pin")
+
+def update_user(user_id: str, fields: Dict[str, Any],
+                expected_version: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Apply all field changes to one user in a single request. With
+    expected_version (the updated_at the editor saw), the write only applies
+    if nobody changed the user since; returns None when it did not or when
+    the user does not exist.
+    """
+    changes = {k: v for k, v in fields.items() if k in USER_EDITABLE_FIELDS}
+    if "email" in changes:
+        changes["email"] = (changes["email"] or "").strip().lower()
+    if not changes:
+        raise ValueError("No editable user fields given")
+
+    q = sb.table("users").update(changes).eq("id", user_id)
+    if expected_version:
+        q = q.eq("updated_at", expected_version)
+    row = _single(q.execute())
+    invalidate_user_directory()
+    return row
+
 # =========================================================
 # ============== ITEMS & INVENTORY (same API) =============
 # =========================================================
@@ -75,16 +178,74 @@ def get_all_items() -> List[Dict[str, Any]]:
         raise RuntimeError(res.error.message)
     return res.data or []
 
-def get_item_by_id(item_id: str) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]]]:
-    item = _single(sb.table("products").select("*").eq("id", item_id).limit(1).execute())
-    logs: List[Dict[str, Any]] = []
-    if item and item.get("article_number"):
-        lr = sb.table("logs").select("*").eq("article_number", item["article_number"]) \
-             .order("timestamp", desc=True).execute()
-        if lr.error:
-            raise RuntimeError(lr.error.message)
-        logs = lr.data or []
-    return item, logs
+def get_products_by_articles(article_numbers: List[str], columns: str = "*") -> Dict[str, Dict[str, Any]]:
+    """Products for the given article numbers, keyed by article_number (chunked in_() queries)."""
+    articles = sorted({str(a).strip() for a in (article_numbers or []) if str(a or "").strip()})
+    if columns != "*" and "article_number" not in [c.strip() for c in columns.split(",")]:
+        columns = f"article_number, {columns}"
+    out: Dict[str, Dict[str, Any]] = {}
+    for i in range(0, len(articles), 100):
+        r = sb.table("products").select(columns).in_("article_number", articles[i:i + 100]).execute()
+        if r.error:
+            raise RuntimeError(r.error.message)
+        for row in r.data or []:
+            out[str(row.get("article_number") or "").strip()] = row
+    return out
+
+# ---------- Product cache ----------
+# Single products by id, cached for PRODUCT_CACHE_TTL seconds and dropped by
+# every product write in this module.
+_product_cache = TTLCache(ttl=float(os.environ.get("PRODUCT_CACHE_TTL", "60")))
+
+def invalidate_product_cache():
+    _product_cache.invalidate()
+
+def get_product_by_id_cached(item_id: str) -> Optional[Dict[str, Any]]:
+    key = str(item_id)
+    row = _product_cache.get(key)
+    if row is not None:
+        return row
+    row = _single(sb.table("products").select("*").eq("id", item_id).limit(1).execute())
+    # A miss is not cached, so a product created a moment ago is found
+    if row is not None:
+        _product_cache.set(key, row)
+    return row
+
+# Columns the item history shows
+ITEM_HISTORY_COLUMNS = "id, timestamp, user_name, action, quantity, status"
+
+def get_item_history(article_number: str, after: Optional[Tuple[str, str]] = None, limit: int = 25,
+                     include_history: bool = False) -> Tuple[List[Dict[str, Any]], Optional[Tuple[str, str]]]:
+    """
+    One page of an article's logs, newest first, keyset on (timestamp, id)
+    along the (article_number, timestamp) index. `after` is the cursor of
+    the previous page. Returns (rows, cursor of the next page or None).
+    """
+    limit = max(1, min(int(limit), 200))
+    columns = ITEM_HISTORY_COLUMNS
+    if "status" not in _logs_columns():
+        columns = columns.replace(", status", "")
+    q = sb.table(_logs_source(include_history)).select(columns).eq("article_number", article_number)
+    if after:
+        ts, last_id = after
+        q = q.or_(f'timestamp.lt."{ts}",and(timestamp.eq."{ts}",id.lt."{last_id}")')
+    r = q.order("timestamp", desc=True).order("id", desc=True).limit(limit + 1).execute()
+    if r.error:
+        raise RuntimeError(r.error.message)
+    rows = r.data or []
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, (str(rows[-1].get("timestamp")), str(rows[-1].get("id")))
+
+def get_item_by_id(item_id: str, history_limit: int = 25) \
+        -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]], Optional[Tuple[str, str]]]:
+    """(product from the cache, first page of its history, cursor of the next page)."""
+    item = get_product_by_id_cached(item_id)
+    if not item or not item.get("article_number"):
+        return item, [], None
+    logs, next_cursor = get_item_history(item["article_number"], limit=history_limit)
+    return item, logs, next_cursor
 
 # =========================================================
 # =============== STOCK UPDATES (same logic) ==============
@@ -103,7 +264,8 @@ def update_item_stock(item_id: str, quantity: int, action: str):
     if action not in ("take", "return"):
         raise ValueError("Invalid action; must be 'take' or 'return'")
 
-    prod = _single(sb.table("products").select("id, stock, product_description").eq("id", item_id).limit(1).execute())
+    prod = _single(sb.table("products").select("id, article_number, stock, safety_stock, product_description")
+                   .eq("id", item_id).limit(1).execute())
     if not prod:
         raise Exception(f"Item {item_id} not found")
 
@@ -119,10 +281,29 @@ def update_item_stock(item_id: str, quantity: int, action: str):
     ur = sb.table("products").update({"stock": new_stock}).eq("id", item_id).execute()
     if ur.error:
         raise RuntimeError(ur.error.message)
+    invalidate_product_cache()
     # print like old code
     print(f"✅ Stock updated: {(prod.get('product_description') or item_id)} → {new_stock}")
+    _publish_stock_change(prod, current_stock, new_stock, action)
     return _single(ur)
 
+def _publish_stock_change(prod: Dict[str, Any], old_stock: int, new_stock: int, action: str):
+    """Notify SSE subscribers (app/events) of the change and of safety-stock crossings."""
+    safety = _ensure_int(prod.get("safety_stock"), 0)
+    data = {
+        "item_id": prod.get("id"),
+        "article_number": prod.get("article_number"),
+        "product_description": prod.get("product_description"),
+        "action": action,
+        "previous_stock": old_stock,
+        "stock": new_stock,
+        "safety_stock": safety,
+    }
+    events.publish(events.STOCK_CHANGED, data)
+    if safety > 0 and (old_stock < safety) != (new_stock < safety):
+        events.publish(events.SAFETY_THRESHOLD_CROSSED,
+                       {**data, "direction": "below" if new_stock < safety else "restored"})
+
 # =========================================================
 # ====================== LOGGING ==========================
 # =========================================================
@@ -149,8 +330,59 @@ def insert_log(article_number: str, quantity: int, action: str, user_name: str,
     ir = sb.table("logs").insert(payload).execute()
     if ir.error:
         raise RuntimeError(ir.error.message)
+    _bump_usage_rollup(payload)
+    _record_product_activity(payload)
     return _single(ir)
 
+def _bump_usage_rollup(log: Dict[str, Any]):
+    # Keep the daily rollup in step with the log; a failure here must not
+    # fail the movement itself (`flask backfill-usage-rollups` repairs it).
+    try:
+        r = sb.rpc("bump_usage_rollup", {
+            "p_day": log["timestamp"][:10],
+            "p_article_number": log["article_number"],
+            "p_user_name": log.get("user_name") or "",
+            "p_action": (log.get("action") or "").strip().lower(),
+            "p_quantity": _ensure_int(log.get("quantity"), 0),
+        }).execute()
+        if r.error:
+            print("⚠️ Usage rollup not updated:", r.error.message)
+    except Exception as e:
+        print("⚠️ Usage rollup not updated:", e)
+
+def _record_product_activity(log: Dict[str, Any]):
+    # last_movement_at / last_taken_by / last_returned_at / takes_30d on the
+    # product (after the rollup, which takes_30d is summed from). Like the
+    # rollup, a failure must not fail the movement (`flask backfill-product-activity`).
+    try:
+        r = sb.rpc("record_product_activity", {
+            "p_article_number": log["article_number"],
+            "p_action": (log.get("action") or "").strip().lower(),
+            "p_user_name": log.get("user_name") or "",
+            "p_at": log["timestamp"],
+        }).execute()
+        if r.error:
+            print("⚠️ Product activity not updated:", r.error.message)
+    except Exception as e:
+        print("⚠️ Product activity not updated:", e)
+    invalidate_product_cache()
+
+def rebuild_product_activity() -> int:
+    """Recompute the last-activity fields of every product from the logs; returns products updated."""
+    r = sb.rpc("refresh_product_activity", {}).execute()
+    if r.error:
+        raise RuntimeError(r.error.message)
+    invalidate_product_cache()
+    return int(r.data or 0)
+
+def refresh_product_takes_30d() -> int:
+    """Roll takes_30d forward (days drop out of the window); returns products changed."""
+    r = sb.rpc("refresh_product_takes_30d", {}).execute()
+    if r.error:
+        raise RuntimeError(r.error.message)
+    invalidate_product_cache()
+    return int(r.data or 0)
+
 def _logs_columns() -> set:
     # cache columns to avoid frequent requests (cheap & simple)
     # If this fails, we just return empty set to avoid blocking inserts.
@@ -178,12 +410,180 @@ def insert_issue_log(article_number: str, issue: str, user_name: str, timestamp:
         raise RuntimeError(r.error.message)
     return _single(r)
 
-def get_logs_for_item(article_number: str) -> List[Dict[str, Any]]:
-    r = sb.table("logs").select("*").eq("article_number", article_number).order("timestamp", desc=True).execute()
+# ---------- Hot / archived logs ----------
+# 'logs' holds the recent (hot) rows; archive_logs() moves older ones to
+# 'logs_archive' and carries their take/return totals forward in
+# 'logs_archived_balances'. 'logs_all' reads both (app/supabase/016).
+LOGS_TABLE = "logs"
+LOGS_WITH_HISTORY = "logs_all"
+
+def _logs_source(include_history: bool = False) -> str:
+    return LOGS_WITH_HISTORY if include_history else LOGS_TABLE
+
+def iter_table_rows(table: str, columns: Optional[List[str]] = None, ts_column: str = "timestamp",
+                    date_from: Optional[str] = None, date_to: Optional[str] = None,
+                    after: Optional[Tuple[str, str]] = None, page_size: int = 1000):
+    """
+    Yield the rows of `table` oldest first, one keyset page at a time on
+    (ts_column, id), so long exports never use deep offsets. Without a date
+    range, rows whose ts_column is NULL follow at the end, paged on id.
+
+      columns   only these columns (default: all)
+      date_from / date_to   ISO dates, inclusive, on ts_column
+      after     (ts, id) of the last dated row already read; start after it
+    """
+    if after and after[0] in (None, "", "None", "NaT"):
+        raise ValueError(f"iter_table_rows: cursor without a {ts_column}: {after!r}")
+
+    wanted = list(columns or [])
+    fetch = ",".join(dict.fromkeys(wanted + [ts_column, "id"])) if wanted else "*"
+
+    while True:
+        q = sb.table(table).select(fetch).not_.is_(ts_column, "null")
+        if date_from:
+            q = q.gte(ts_column, date_from)
+        if date_to:
+            q = q.lt(ts_column, (datetime.fromisoformat(date_to) + timedelta(days=1)).date().isoformat())
+        if after:
+            ts, last_id = after
+            q = q.or_(f'{ts_column}.gt."{ts}",and({ts_column}.eq."{ts}",id.gt."{last_id}")')
+
+        r = q.order(ts_column).order("id").limit(page_size).execute()
+        if r.error:
+            raise RuntimeError(r.error.message)
+        rows = r.data or []
+        for row in rows:
+            yield {c: row.get(c) for c in wanted} if wanted else row
+        if len(rows) < page_size:
+            break
+        after = (str(rows[-1].get(ts_column)), str(rows[-1].get("id")))
+
+    if date_from or date_to:
+        return
+    # Undated rows: no place in the (ts, id) order, so they come last
+    last_id = None
+    while True:
+        q = sb.table(table).select(fetch).is_(ts_column, "null")
+        if last_id is not None:
+            q = q.gt("id", last_id)
+        r = q.order("id").limit(page_size).execute()
+        if r.error:
+            raise RuntimeError(r.error.message)
+        rows = r.data or []
+        for row in rows:
+            yield {c: row.get(c) for c in wanted} if wanted else row
+        if len(rows) < page_size:
+            return
+        last_id = str(rows[-1].get("id"))
+
+def _pattern_term(value: str) -> str:
+    """Search text safe inside a PostgREST or()/ilike filter."""
+    return "".join(ch for ch in (value or "").strip() if ch not in ',()%*"\\')
+
+def get_logs_page(user: str = "", item: str = "", action: Optional[str] = None,
+                  date_from: Optional[str] = None, date_to: Optional[str] = None,
+                  after: Optional[Tuple[str, str]] = None,
+                  limit: int = 50, include_history: bool = False) -> Tuple[List[Dict[str, Any]], Optional[Tuple[str, str]]]:
+    """
+    One page of logs, newest first, filtered in the database.
+
+      user      substring of user_name
+      item      substring of article_number or of the product name
+      action    exact action (take / return)
+      date_from / date_to   ISO dates, inclusive
+      after     (timestamp, id) of the last row already shown (keyset cursor)
+      include_history   also search the archived logs
+
+    Returns (rows, cursor of the next page or None when this was the last).
+    """
+    limit = max(1, min(int(limit), 200))
+    q = sb.table(_logs_source(include_history)).select("*")
+
+    user = _pattern_term(user)
+    if user:
+        q = q.ilike("user_name", f"%{user}%")
+
+    item = _pattern_term(item)
+    if item:
+        pr = sb.table("products").select("article_number").ilike("product_name", f"%{item}%").limit(200).execute()
+        if pr.error:
+            raise RuntimeError(pr.error.message)
+        named = sorted({str(p["article_number"]) for p in (pr.data or []) if p.get("article_number")})
+        clauses = [f"article_number.ilike.*{item}*"]
+        if named:
+            clauses.append("article_number.in.(" + ",".join(f'"{a}"' for a in named) + ")")
+        q = q.or_(",".join(clauses))
+
+    if action:
+        q = q.eq("action", action.strip().lower())
+    if date_from:
+        q = q.gte("timestamp", date_from)
+    if date_to:
+        # inclusive day: everything before the next midnight
+        q = q.lt("timestamp", (datetime.fromisoformat(date_to) + timedelta(days=1)).date().isoformat())
+
+    if after:
+        ts, last_id = after
+        q = q.or_(f'timestamp.lt."{ts}",and(timestamp.eq."{ts}",id.lt."{last_id}")')
+
+    # One extra row tells whether another page exists
+    r = q.order("timestamp", desc=True).order("id", desc=True).limit(limit + 1).execute()
+    if r.error:
+        raise RuntimeError(r.error.message)
+    rows = r.data or []
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, (str(rows[-1].get("timestamp")), str(rows[-1].get("id")))
+
+def get_user_article_totals(user_name: str) -> List[Dict[str, Any]]:
+    """
+    {article_number, taken, returned, movements, last_at} of one user's
+    movements per article, over the hot logs plus the archived totals,
+    summed in the database (user_article_totals RPC, app/supabase/024).
+    """
+    r = sb.rpc("user_article_totals", {"p_user_name": user_name}).execute()
     if r.error:
         raise RuntimeError(r.error.message)
     return r.data or []
 
+def get_issue_reports(columns: str = "*") -> List[Dict[str, Any]]:
+    r = sb.table("issue_reports").select(columns).execute()
+    if r.error:
+        raise RuntimeError(r.error.message)
+    return r.data or []
+
+def get_article_user_balances(article_numbers: List[str]) -> List[Dict[str, Any]]:
+    """
+    {article_number, user_name, net} for the given articles: takes minus
+    returns over the hot logs plus the archived totals, summed in the
+    database (article_user_balances RPC, app/supabase/021).
+    """
+    articles = sorted({str(a).strip() for a in (article_numbers or []) if str(a or "").strip()})
+    rows: List[Dict[str, Any]] = []
+    for i in range(0, len(articles), 500):
+        r = sb.rpc("article_user_balances", {"p_articles": articles[i:i + 500]}).execute()
+        if r.error:
+            raise RuntimeError(r.error.message)
+        rows.extend(r.data or [])
+    return rows
+
+def archive_logs(before: str, batch_size: int = 5000) -> int:
+    """
+    Move every log row older than `before` (ISO timestamp) to logs_archive,
+    batch by batch, keeping the balances in logs_archived_balances.
+    Returns the rows moved.
+    """
+    moved = 0
+    while True:
+        r = sb.rpc("archive_logs", {"p_before": before, "p_batch": batch_size}).execute()
+        if r.error:
+            raise RuntimeError(r.error.message)
+        n = int(r.data or 0)
+        moved += n
+        if n < batch_size:
+            return moved
+
 # =========================================================
 # ============== REQUESTS / RESERVATIONS / DELIVERIES =====
 # (Optional: only if you created these tables in Postgres.)
@@ -254,6 +654,7 @@ def set_comment_on_stock(article_number: str, comment: str) -> bool:
     r = sb.table("products").update({"comment_on_stock": comment}).eq("article_number", article_number).execute()
     if r.error:
         raise RuntimeError(r.error.message)
+    invalidate_product_cache()
     return bool(r.data)
 
 # =========================================================
@@ -279,6 +680,514 @@ def get_items_below_safety_stock() -> List[Dict[str, Any]]:
     result.sort(key=lambda x: (x.get("deficit", 0), -x.get("safety_stock_int", 0)), reverse=True)
     return result
 
+def get_article_usage_stats(since: str, action: str = "take", page_size: int = 1000) -> List[Dict[str, Any]]:
+    """
+    Per-article {article_number, total, total_sq, active_days} of the daily
+    totals since `since` (ISO date), aggregated in the database
+    (article_usage_stats RPC, app/supabase/020) and paged by article_number.
+    """
+    rows: List[Dict[str, Any]] = []
+    after = None
+    while True:
+        r = sb.rpc("article_usage_stats", {
+            "p_since": since, "p_action": action, "p_after": after, "p_limit": page_size,
+        }).execute()
+        if r.error:
+            raise RuntimeError(r.error.message)
+        page = r.data or []
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        after = page[-1]["article_number"]
+
+USAGE_TOTALS_BY = ("user", "article", "day")
+
+def get_usage_totals(by: str, action: Optional[str] = "take", since: Optional[str] = None,
+                     limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Usage totals per user, article or day, grouped in the database
+    (usage_totals RPC, app/supabase/018). Rows: {key, quantity, movements},
+    largest quantity first ('day': oldest day first).
+    """
+    if by not in USAGE_TOTALS_BY:
+        raise ValueError(f"by must be one of {', '.join(USAGE_TOTALS_BY)}")
+    r = sb.rpc("usage_totals", {"p_by": by, "p_action": action, "p_since": since, "p_limit": limit}).execute()
+    if r.error:
+        raise RuntimeError(r.error.message)
+    return r.data or []
+
+def get_usage_user_names() -> List[str]:
+    """Every user that has at least one logged movement (distinct, in the database)."""
+    r = sb.rpc("usage_user_names", {}).execute()
+    if r.error:
+        raise RuntimeError(r.error.message)
+    return sorted(name for name in (r.data or []) if name)
+
+USAGE_GROUP_BY = ("day", "week", "month")
+USAGE_DIMENSIONS = ("user", "article", "category")
+
+def get_usage_summary(date_from: str, date_to: str, group_by: str = "day", by: str = "article",
+                      action: Optional[str] = "take") -> List[Dict[str, Any]]:
+    """
+    Usage totals per period and user/article/category, grouped in the
+    database (usage_summary RPC over 'usage_daily_rollup'), returned as one
+    jsonb array so long ranges are not capped (app/supabase/023).
+    Rows: {period, key, label, quantity, movements}.
+    """
+    if group_by not in USAGE_GROUP_BY:
+        raise ValueError(f"group_by must be one of {', '.join(USAGE_GROUP_BY)}")
+    if by not in USAGE_DIMENSIONS:
+        raise ValueError(f"by must be one of {', '.join(USAGE_DIMENSIONS)}")
+    r = sb.rpc("usage_summary", {
+        "p_from": date_from,
+        "p_to": date_to,
+        "p_group_by": group_by,
+        "p_by": by,
+        "p_action": action,
+    }).execute()
+    if r.error:
+        raise RuntimeError(r.error.message)
+    return r.data or []
+
+def rebuild_usage_rollup(day_from: str, day_to: str) -> int:
+    """
+    Recompute the rollup rows of [day_from, day_to] (ISO dates, inclusive)
+    from the hot and archived logs, in the database (app/supabase/022).
+    Returns the rollup rows written.
+    """
+    r = sb.rpc("rebuild_usage_rollup", {"p_from": day_from, "p_to": day_to}).execute()
+    if r.error:
+        raise RuntimeError(r.error.message)
+    return int(r.data or 0)
+
+# =========================================================
+# ================== REORDER POINTS =======================
+# =========================================================
+def get_reorder_points(columns: str = "*") -> List[Dict[str, Any]]:
+    r = sb.table("reorder_points").select(columns).execute()
+    if r.error:
+        raise RuntimeError(r.error.message)
+    return r.data or []
+
+def upsert_reorder_points(rows: List[Dict[str, Any]], chunk_size: int = 500) -> int:
+    for i in range(0, len(rows), chunk_size):
+        r = sb.table("reorder_points").upsert(rows[i:i + chunk_size], on_conflict="article_number").execute()
+        if r.error:
+            raise RuntimeError(r.error.message)
+    return len(rows)
+
+# =========================================================
+# ============ DATA ANALYTICS (project movements) =========
+# =========================================================
+# Sheet header -> column in the 'data_analytics' table (see app/supabase/).
+DATA_ANALYTICS_COLUMNS = {
+    "Article Number": "article_number",
+    "Order time": "order_time",
+    "Order status": "order_status",
+    "Warehouse": "warehouse",
+    "Driller": "driller",
+    "Drilling unit / Project number": "project_number",
+    "Pickup time": "pickup_time",
+    "Item name": "item_name",
+    "Projected quantity": "projected_quantity",
+    "Taken quantity": "taken_quantity",
+    "Returned quantity": "returned_quantity",
+    "Comments": "comments",
+}
+
+# Filters are substring matches (ilike) on these columns
+_DATA_ANALYTICS_FILTERS = {
+    "article": "article_number",
+    "project": "project_number",
+    "driller": "driller",
+    "item": "item_name",
+}
+
+def get_data_analytics_page(filters: Optional[Dict[str, str]] = None, sort: str = "order_time",
+                            descending: bool = True, limit: int = 25,
+                            offset: int = 0) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    One page of 'data_analytics' rows, filtered/sorted/paged in the database.
+    Returns (rows, total_matching_rows).
+    """
+    if sort not in DATA_ANALYTICS_COLUMNS.values():
+        raise ValueError(f"Cannot sort by '{sort}'")
+    limit = max(1, min(int(limit), 200))
+    offset = max(0, int(offset))
+
+    q = sb.table("data_analytics").select(", ".join(DATA_ANALYTICS_COLUMNS.values()), count="exact")
+    for key, value in (filters or {}).items():
+        col = _DATA_ANALYTICS_FILTERS.get(key)
+        value = (value or "").strip()
+        if col and value:
+            q = q.ilike(col, f"%{value}%")
+    # Tie-break on the composite key so pages are stable
+    q = q.order(sort, desc=descending)
+    for col in ("project_number", "article_number"):
+        if col != sort:
+            q = q.order(col)
+
+    r = q.range(offset, offset + limit - 1).execute()
+    if r.error:
+        raise RuntimeError(r.error.message)
+    return r.data or [], r.count or 0
+
+def get_data_analytics_rows_for_projects(project_numbers: List[str]) -> List[Dict[str, Any]]:
+    """Existing 'data_analytics' rows (with id) for the given project numbers."""
+    project_numbers = sorted({str(p).strip() for p in project_numbers if str(p or "").strip()})
+    rows: List[Dict[str, Any]] = []
+    # Chunk the IN list to keep the request URL short
+    for i in range(0, len(project_numbers), 100):
+        r = sb.table("data_analytics").select("id, " + ", ".join(DATA_ANALYTICS_COLUMNS.values())) \
+              .in_("project_number", project_numbers[i:i + 100]).execute()
+        if r.error:
+            raise RuntimeError(r.error.message)
+        rows.extend(r.data or [])
+    return rows
+
+def upsert_data_analytics_rows(rows: List[Dict[str, Any]], chunk_size: int = 500) -> int:
+    """
+    Bulk upsert on (article_number, project_number, order_time), chunk_size
+    rows per request. Returns the number of rows sent.
+    """
+    for i in range(0, len(rows), chunk_size):
+        r = sb.table("data_analytics") \
+              .upsert(rows[i:i + chunk_size], on_conflict="article_number,project_number,order_time") \
+              .execute()
+        if r.error:
+            raise RuntimeError(r.error.message)
+    return len(rows)
+
+# =========================================================
+# ================== PROJECTS =============================
+# =========================================================
+def get_projects_updated_since(since: Optional[str] = None, page_size: int = 1000) -> List[Dict[str, Any]]:
+    """
+    Projects whose updated_at is >= since (all projects when since is None),
+    oldest change first so callers can advance a watermark as they go.
+    Read in keyset pages on (updated_at, id), so no result is capped.
+    """
+    rows: List[Dict[str, Any]] = []
+    after = None
+    while True:
+        q = sb.table("projects").select("*")
+        if since:
+            q = q.gte("updated_at", since)
+        if after:
+            ts, last_id = after
+            q = q.or_(f'updated_at.gt."{ts}",and(updated_at.eq."{ts}",id.gt."{last_id}")')
+        r = q.order("updated_at").order("id").limit(page_size).execute()
+        if r.error:
+            raise RuntimeError(r.error.message)
+        page = r.data or []
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        after = (str(page[-1].get("updated_at")), str(page[-1].get("id")))
+
+PROJECT_JSON_COLUMNS = ("workers", "items", "taken_by_worker", "returned_by_worker")
+
+def repair_project_json() -> Tuple[int, List[str]]:
+    """
+    Rewrite project JSON columns stored as Python reprs (legacy Sheets
+    rows, e.g. "[{'item_id': '1'}]") as JSON text, so the jsonb migration
+    (app/supabase/009) keeps them. Returns (cells rewritten, project numbers
+    with cells that are neither JSON nor a Python list/dict).
+    """
+    fixed = 0
+    unfixable: List[str] = []
+    for project in get_projects_updated_since(None):
+        changes = {}
+        for col in PROJECT_JSON_COLUMNS:
+            value = project.get(col)
+            if not isinstance(value, str) or not value.strip():
+                continue
+            try:
+                json.loads(value)
+                continue
+            except ValueError:
+                pass
+            try:
+                parsed = ast.literal_eval(value.strip())
+            except (ValueError, SyntaxError):
+                parsed = None
+            if isinstance(parsed, (list, dict)):
+                changes[col] = json.dumps(parsed, ensure_ascii=False, default=str)
+            else:
+                unfixable.append(str(project.get("project_number") or project.get("id")))
+        if changes:
+            r = sb.table("projects").update(changes).eq("id", project["id"]).execute()
+            if r.error:
+                raise RuntimeError(r.error.message)
+            fixed += len(changes)
+    if fixed:
+        _project_cache.invalidate()
+    return fixed, sorted(set(unfixable))
+
+# Single-project reads by project_number (unique index, see app/supabase/007).
+# Cached briefly for the read-only project item lists; only found projects
+# are cached, and create/update/append clear the cache.
+_project_cache = TTLCache(ttl=float(os.environ.get("PROJECT_CACHE_TTL", "30")))
+
+def get_project_by_number(project_number: str, columns: str = "*") \
+        -> Tuple[Optional[Dict[str, Any]], Optional[Any], Optional[str]]:
+    """
+    (row, id, version) of the project with this project_number, or
+    (None, None, None). The version is updated_at; pass it to
+    update_project() to detect concurrent edits.
+    """
+    pn = (project_number or "").strip()
+    if not pn:
+        return None, None, None
+    if columns != "*" and "id" not in [c.strip() for c in columns.split(",")]:
+        columns = f"id, updated_at, {columns}"
+    row = _single(sb.table("projects").select(columns).eq("project_number", pn).limit(1).execute())
+    if not row:
+        return None, None, None
+    return row, row.get("id"), row.get("updated_at")
+
+def get_project_by_number_cached(project_number: str) \
+        -> Tuple[Optional[Dict[str, Any]], Optional[Any], Optional[str]]:
+    """get_project_by_number() through a short TTL cache; use for reads only."""
+    pn = (project_number or "").strip()
+    found = _project_cache.get(pn)
+    if found is not None:
+        return found
+    found = get_project_by_number(pn)
+    # A miss is not cached, so a project created a moment ago is found
+    if found[0] is not None:
+        _project_cache.set(pn, found)
+    return found
+
+def create_project(fields: Dict[str, Any]) -> Dict[str, Any]:
+    """Insert a project and its project_members rows; returns the new row."""
+    payload = dict(fields)
+    payload.setdefault("id", str(uuid.uuid4()))
+    payload.setdefault("created_at", _utcnow_iso())
+    payload.setdefault("status", "active")
+    row = _single(sb.table("projects").insert(payload).execute())
+    _project_cache.invalidate()
+    set_project_members(payload["id"], row or payload)
+    return row
+
+def update_project(project_id: Any, fields: Dict[str, Any],
+                   expected_version: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Update one project by id. With expected_version, the write only applies
+    if updated_at still matches; returns None when it did not (someone else
+    changed the project in between) or when the project does not exist.
+    """
+    q = sb.table("projects").update(fields).eq("id", project_id)
+    if expected_version:
+        q = q.eq("updated_at", expected_version)
+    row = _single(q.execute())
+    _project_cache.invalidate()
+    if row and ("workers" in fields or "created_by" in fields):
+        set_project_members(project_id, row)
+    return row
+
+# Everything a project picker needs; leaves out the movement history
+PROJECT_LIST_COLUMNS = "id, project_number, customer_name, status, start_date, end_date, created_by, created_at, workers, items"
+
+def search_projects(search: str = "", status: Optional[str] = None, limit: int = 50,
+                    offset: int = 0, columns: str = PROJECT_LIST_COLUMNS) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Projects whose project_number or customer_name contains `search`
+    (trigram-indexed), optionally with one status, ordered by project_number.
+    Returns (rows, total_matching_rows).
+    """
+    limit = max(1, min(int(limit), 200))
+    offset = max(0, int(offset))
+
+    q = sb.table("projects").select(columns, count="exact")
+    # Characters that would break the PostgREST or() syntax or act as wildcards
+    term = "".join(ch for ch in (search or "").strip() if ch not in ",()%*\\")
+    if term:
+        q = q.or_(f"project_number.ilike.*{term}*,customer_name.ilike.*{term}*")
+    if status:
+        q = q.eq("status", status.strip().lower())
+    r = q.order("project_number").range(offset, offset + limit - 1).execute()
+    if r.error:
+        raise RuntimeError(r.error.message)
+    return r.data or [], r.count or 0
+
+PROJECT_MOVEMENT_KINDS = ("taken", "returned")
+
+def append_project_movements(project_number: str, kind: str, items: List[Dict[str, Any]]) -> bool:
+    """
+    Append movement lines to a project's taken_by_worker ("taken") or
+    returned_by_worker ("returned") in one RPC; only the new lines are sent.
+    Returns False when no project has this number.
+    """
+    if kind not in PROJECT_MOVEMENT_KINDS:
+        raise ValueError(f"kind must be one of {PROJECT_MOVEMENT_KINDS}")
+    if not items:
+        return True
+    r = sb.rpc("append_project_movements", {
+        "p_project_number": (project_number or "").strip(),
+        "p_kind": kind,
+        "p_items": items,
+    }).execute()
+    if r.error:
+        raise RuntimeError(r.error.message)
+    _project_cache.invalidate()
+    return bool(r.data)
+
+def get_project_item_summaries(project_ids: List[Any]) -> Dict[Any, List[Dict[str, Any]]]:
+    """
+    project_id -> per-article totals (projected, taken, returned, used,
+    broken) from 'project_item_summaries', ordered by article_number.
+    """
+    ids = sorted({str(i) for i in (project_ids or []) if i})
+    out: Dict[Any, List[Dict[str, Any]]] = {}
+    for i in range(0, len(ids), 100):
+        r = sb.table("project_item_summaries").select("*").in_("project_id", ids[i:i + 100]) \
+              .order("article_number").execute()
+        if r.error:
+            raise RuntimeError(r.error.message)
+        for row in r.data or []:
+            out.setdefault(row["project_id"], []).append(row)
+    return out
+
+def rebuild_project_item_summaries() -> int:
+    """Recompute every project's summaries from its JSON columns; returns rows written."""
+    r = sb.rpc("refresh_project_item_summaries", {"p_project_id": None}).execute()
+    if r.error:
+        raise RuntimeError(r.error.message)
+    return int(r.data or 0)
+
+# ---------- Project visibility (project_members) ----------
+def _norm_member(value: Any) -> str:
+    return str(value or "").strip().lower()
+
+def project_member_keys(project: Dict[str, Any]) -> set:
+    """Identifiers that may see the project: creator and every worker's username/email/name."""
+    workers = project.get("workers")
+    if not isinstance(workers, list):
+        try:
+            workers = json.loads(workers or "[]")
+        except Exception:
+            workers = []
+    if isinstance(workers, dict):
+        workers = [workers]
+
+    keys = {_norm_member(project.get("created_by"))}
+    for w in workers:
+        if isinstance(w, dict):
+            keys.update(_norm_member(w.get(k)) for k in ("username", "email", "name"))
+    keys.discard("")
+    return keys
+
+def set_project_members(project_id: Any, project: Dict[str, Any]):
+    """Replace the project_members rows of one project."""
+    r = sb.table("project_members").delete().eq("project_id", project_id).execute()
+    if r.error:
+        raise RuntimeError(r.error.message)
+    rows = [{"project_id": project_id, "member_key": k} for k in sorted(project_member_keys(project))]
+    if rows:
+        r = sb.table("project_members").insert(rows).execute()
+        if r.error:
+            raise RuntimeError(r.error.message)
+
+def rebuild_project_members(batch_size: int = 200) -> int:
+    """
+    Rebuild project_members from every project, `batch_size` projects at a
+    time: their old rows are deleted first, so members no longer on a
+    project lose access. Returns the number of rows written.
+    """
+    projects = get_projects_updated_since(None)
+    written = 0
+    for i in range(0, len(projects), batch_size):
+        batch = projects[i:i + batch_size]
+        r = sb.table("project_members").delete().in_("project_id", [p["id"] for p in batch]).execute()
+        if r.error:
+            raise RuntimeError(r.error.message)
+        rows = [{"project_id": p["id"], "member_key": k} for p in batch for k in sorted(project_member_keys(p))]
+        for j in range(0, len(rows), 500):
+            r = sb.table("project_members").insert(rows[j:j + 500]).execute()
+            if r.error:
+                raise RuntimeError(r.error.message)
+        written += len(rows)
+    return written
+
+def get_projects_with_status(phases: Optional[List[str]] = None,
+                             exclude_phases: Optional[List[str]] = None,
+                             order: str = "start_sort", descending: bool = False,
+                             project_ids: Optional[List[Any]] = None,
+                             columns: str = "*") -> List[Dict[str, Any]]:
+    """
+    Rows of the 'projects_with_status' view (see app/supabase/012): project
+    columns plus typed start_on/end_on and the derived 'phase'
+    (upcoming / active / finished / ...), filtered and ordered in the query.
+    """
+    def query(ids=None):
+        q = sb.table("projects_with_status").select(columns)
+        if ids is not None:
+            q = q.in_("id", ids)
+        if phases:
+            q = q.in_("phase", list(phases))
+        if exclude_phases:
+            q = q.not_.in_("phase", list(exclude_phases))
+        r = q.order(order, desc=descending).order("project_number").execute()
+        if r.error:
+            raise RuntimeError(r.error.message)
+        return r.data or []
+
+    if project_ids is None:
+        return query()
+    ids = sorted({str(i) for i in project_ids if i})
+    if len(ids) <= 100:
+        return query(ids) if ids else []
+    # Long id lists are chunked; merge the (already ordered) chunks
+    rows = [row for i in range(0, len(ids), 100) for row in query(ids[i:i + 100])]
+    rows.sort(key=lambda row: (str(row.get(order) or ""), str(row.get("project_number") or "")), reverse=descending)
+    return rows
+
+def get_member_projects(member_ids: List[str], phases: Optional[List[str]] = None,
+                        exclude_phases: Optional[List[str]] = None,
+                        order: str = "start_sort", descending: bool = False,
+                        page_size: int = 1000) -> List[Dict[str, Any]]:
+    """
+    Projects visible to any of `member_ids` (created by or assigned to),
+    from 'projects_with_status' with the same phase filters and ordering.
+    """
+    keys = sorted({_norm_member(m) for m in member_ids} - {""})
+    if not keys:
+        return []
+    # Paged: a member can be on more projects than one response holds
+    ids: List[Any] = []
+    offset = 0
+    while True:
+        r = sb.table("project_members").select("project_id").in_("member_key", keys) \
+              .order("project_id").order("member_key").range(offset, offset + page_size - 1).execute()
+        if r.error:
+            raise RuntimeError(r.error.message)
+        page = r.data or []
+        ids.extend(row["project_id"] for row in page)
+        if len(page) < page_size:
+            break
+        offset += page_size
+    return get_projects_with_status(phases, exclude_phases, order, descending, project_ids=ids)
+
+# =========================================================
+# ================== JOB SYNC STATE =======================
+# =========================================================
+def get_sync_state(key: str) -> Optional[Dict[str, Any]]:
+    """Bookkeeping row for a background job (last run, watermark, counts)."""
+    return _single(sb.table("sync_state").select("*").eq("key", key).limit(1).execute())
+
+def set_sync_state(key: str, watermark: Optional[str], details: Optional[Dict[str, Any]] = None):
+    payload = {
+        "key": key,
+        "watermark": watermark,
+        "last_synced_at": _utcnow_iso(),
+        "details": details or {},
+    }
+    r = sb.table("sync_state").upsert(payload, on_conflict="key").execute()
+    if r.error:
+        raise RuntimeError(r.error.message)
+    return _single(r)
+
 # =========================================================
 # ============== STORAGE (QR codes & images) ==============
 # =========================================================
@@ -321,6 +1230,38 @@ def find_file_in_storage(file_name: str, folder: str, bucket: str) -> Optional[s
             return f"{prefix}/{file_name}"
     return None
 
+def put_storage_object(bucket: str, path_in_bucket: str, data: bytes,
+                       content_type: str = "application/octet-stream"):
+    """Upload (overwrite) raw bytes at path_in_bucket."""
+    res = sb.storage.from_(bucket).upload(path_in_bucket, data,
+                                          file_options={"content-type": content_type, "upsert": True})
+    if hasattr(res, "error") and res.error:
+        raise RuntimeError(res.error.message)
+
+def get_storage_object(bucket: str, path_in_bucket: str) -> Optional[bytes]:
+    """Raw bytes of an object, or None when it does not exist."""
+    folder, _, name = path_in_bucket.rpartition("/")
+    if name not in list_storage_objects(bucket, folder):
+        return None
+    return sb.storage.from_(bucket).download(path_in_bucket)
+
+def list_storage_objects(bucket: str, folder: str, page_size: int = 1000) -> List[str]:
+    """Names of the objects (and sub folders) directly under `folder`."""
+    names: List[str] = []
+    offset = 0
+    while True:
+        listing = sb.storage.from_(bucket).list(path=folder.strip("/"),
+                                                options={"limit": page_size, "offset": offset})
+        files = getattr(listing, "data", listing) or []
+        names.extend(f["name"] for f in files if isinstance(f, dict) and f.get("name"))
+        if len(files) < page_size:
+            return names
+        offset += page_size
+
+def remove_storage_objects(bucket: str, paths: List[str]):
+    if paths:
+        sb.storage.from_(bucket).remove(list(paths))
+
 def generate_qr_code(data: str, output_path: str):
     import qrcode
     img = qrcode.make(data)
@@ -339,6 +1280,7 @@ def set_product_qr_path(article_number: str, object_path: str) -> bool:
     r = sb.table("products").update({"qr_code_url": object_path}).eq("article_number", article_number).execute()
     if r.error:
         raise RuntimeError(r.error.message)
+    invalidate_product_cache()
     return bool(r.data)
 
 # =========================================================
@@ -442,6 +1384,10 @@ def insert_csv_to_supabase(file_path: str, table: str, unique_column: str):
     r = sb.table(table).upsert(prepared, on_conflict=unique_column).execute()
     if r.error:
         raise RuntimeError(r.error.message)
+    if table == "products":
+        invalidate_product_cache()
+    elif table == "users":
+        invalidate_user_directory()
     for row in rows:
         print(f"✅ Upserted into '{table}': {row.get(unique_column)}")
 
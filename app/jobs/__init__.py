@@ -0,0 +1,147 @@
+import os
+import click
+
+from app.jobs.scheduler import register_job, start_scheduler
+
+
+def _interval(env_name, default):
+    try:
+        return int(os.getenv(env_name, default))
+    except ValueError:
+        return default
+
+
+def _archive_old_logs(days=None):
+    """Archive logs older than `days` (LOGS_RETENTION_DAYS, default 365); returns rows moved."""
+    from datetime import datetime, timedelta, timezone
+    from app.google_sheets.sheets_service import archive_logs, set_sync_state
+
+    days = max(days or _interval("LOGS_RETENTION_DAYS", 365), 1)
+    before = (datetime.now(timezone.utc) - timedelta(days=days)).date().isoformat()
+    moved = archive_logs(before)
+    set_sync_state("logs_archive", before, {"rows": moved, "retention_days": days})
+    return moved
+
+
+def init_jobs(app):
+    """
+    Register background jobs and their CLI commands.
+
+    Jobs run in-process when SCHEDULER_ENABLED is true (one gunicorn worker
+    is enough); otherwise run them from cron with `flask <command>`.
+    """
+    from app.analytics.export_job import export_projects_to_data_analytics
+
+    @app.cli.command("export-data-analytics")
+    @click.option("--full", is_flag=True, help="Re-export every project, ignoring the watermark.")
+    def export_data_analytics_command(full):
+        appended, updated, skipped = export_projects_to_data_analytics(full=full)
+        click.echo(f"appended={appended} updated={updated} skipped={skipped}")
+
+    @app.cli.command("backfill-usage-rollups")
+    def backfill_usage_rollups_command():
+        from app.analytics.rollups import backfill_usage_rollups
+        click.echo(f"rollup rows written: {backfill_usage_rollups()}")
+
+    @app.cli.command("backfill-project-members")
+    def backfill_project_members_command():
+        from app.google_sheets.sheets_service import rebuild_project_members
+        click.echo(f"project_members rows written: {rebuild_project_members()}")
+
+    @app.cli.command("repair-project-json")
+    def repair_project_json_command():
+        from app.google_sheets.sheets_service import repair_project_json
+        fixed, unfixable = repair_project_json()
+        click.echo(f"cells rewritten as JSON: {fixed}")
+        if unfixable:
+            click.echo(f"not JSON and not a Python literal (fix by hand): {', '.join(unfixable)}")
+
+    @app.cli.command("backfill-project-summaries")
+    def backfill_project_summaries_command():
+        from app.google_sheets.sheets_service import rebuild_project_item_summaries
+        click.echo(f"project_item_summaries rows written: {rebuild_project_item_summaries()}")
+
+    @app.cli.command("backfill-product-activity")
+    def backfill_product_activity_command():
+        from app.google_sheets.sheets_service import rebuild_product_activity
+        click.echo(f"products updated: {rebuild_product_activity()}")
+
+    @app.cli.command("compute-reorder-points")
+    def compute_reorder_points_command():
+        from app.analytics.reorder import run_reorder_points
+        articles, flagged = run_reorder_points()
+        click.echo(f"articles={articles} needs_reorder={flagged}")
+
+    @app.cli.command("compact-snapshots")
+    @click.option("--full", is_flag=True, help="Rebuild every month from the tables (picks up old edits and deletes).")
+    def compact_snapshots_command(full):
+        from app.analytics.snapshots import compact_snapshots
+        for name, rows in compact_snapshots(full=full).items():
+            click.echo(f"{name}: {rows} rows")
+
+    @app.cli.command("append-snapshots")
+    def append_snapshots_command():
+        from app.analytics.snapshots import append_snapshots
+        for name, rows in append_snapshots().items():
+            click.echo(f"{name}: {rows} rows")
+
+    @app.cli.command("archive-logs")
+    @click.option("--days", type=int, default=None, help="Retention window (default LOGS_RETENTION_DAYS or 365).")
+    def archive_logs_command(days):
+        click.echo(f"logs archived: {_archive_old_logs(days)}")
+
+    register_job(
+        "data_analytics_export",
+        _interval("DATA_ANALYTICS_EXPORT_INTERVAL", 300),
+        export_projects_to_data_analytics,
+    )
+
+    def _reorder_points_job():
+        from app.analytics.reorder import run_reorder_points
+        return run_reorder_points()
+
+    register_job(
+        "reorder_points",
+        _interval("REORDER_POINTS_INTERVAL", 3600),
+        _reorder_points_job,
+    )
+
+    def _compact_snapshots_job():
+        from app.analytics.snapshots import compact_snapshots
+        return compact_snapshots()
+
+    def _append_snapshots_job():
+        from app.analytics.snapshots import append_snapshots
+        return append_snapshots()
+
+    # Parquet snapshots: nightly compaction, today's rows appended in between
+    register_job(
+        "snapshot_compaction",
+        _interval("SNAPSHOT_COMPACT_INTERVAL", 86400),
+        _compact_snapshots_job,
+    )
+    register_job(
+        "snapshot_append",
+        _interval("SNAPSHOT_APPEND_INTERVAL", 900),
+        _append_snapshots_job,
+    )
+
+    def _product_takes_job():
+        from app.google_sheets.sheets_service import refresh_product_takes_30d
+        return refresh_product_takes_30d()
+
+    # takes_30d is a rolling window; days with takes drop out of it over time
+    register_job(
+        "product_takes_30d",
+        _interval("PRODUCT_TAKES_INTERVAL", 86400),
+        _product_takes_job,
+    )
+
+    register_job(
+        "logs_archive",
+        _interval("LOGS_ARCHIVE_INTERVAL", 86400),
+        _archive_old_logs,
+    )
+
+    if os.getenv("SCHEDULER_ENABLED", "").strip().lower() in ("1", "true", "yes"):
+        start_scheduler()
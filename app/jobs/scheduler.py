@@ -0,0 +1,45 @@
+# app/jobs/scheduler.py
+import threading
+import time
+import traceback
+
+# name -> (interval_seconds, func)
+_jobs = {}
+_started = False
+_start_lock = threading.Lock()
+
+
+def register_job(name, interval_seconds, func):
+    """Run func every interval_seconds in a background thread (0 disables it)."""
+    if interval_seconds and interval_seconds > 0:
+        _jobs[name] = (interval_seconds, func)
+
+
+def _run_forever(name, interval_seconds, func):
+    while True:
+        started = time.monotonic()
+        try:
+            result = func()
+            print(f"⏱️ Job '{name}' finished: {result}")
+        except Exception as e:
+            print(f"❌ Job '{name}' failed:", e)
+            traceback.print_exc()
+        # Keep a steady cadence even if the job itself took a while
+        time.sleep(max(interval_seconds - (time.monotonic() - started), 1))
+
+
+def start_scheduler():
+    """Start one daemon thread per registered job (idempotent)."""
+    global _started
+    with _start_lock:
+        if _started:
+            return
+        for name, (interval_seconds, func) in _jobs.items():
+            t = threading.Thread(
+                target=_run_forever,
+                args=(name, interval_seconds, func),
+                name=f"job-{name}",
+                daemon=True,
+            )
+            t.start()
+        _started = True
@@ -9,6 +9,8 @@ load_dotenv()
 # Import routes setup and utilities
 from app.routes import init_routes
 from app.routes.shared.utils import init_logger
+from app.routes.shared.timestamps import init_timestamp_filters
+from app.jobs import init_jobs
 from app.config import company_name  # ✅ Import your company config
 
 def create_app():
@@ -35,9 +37,15 @@ def create_app():
 
     init_routes(app)  # This should register inventory_bp
 
+    # 🕒 {{ value|localtime }} in DISPLAY_TIMEZONE
+    init_timestamp_filters(app)
+
     # ✅ Init logging
     init_logger()
 
+    # ⏱️ Background jobs (scheduler + CLI commands)
+    init_jobs(app)
+
     # 🌐 Inject company name/slogan into all templates
     @app.context_processor
     def inject_company_info():
@@ -10,6 +10,7 @@ from app.routes.logs import logs_bp
 from app.routes.user_stats import user_stats_bp
 from app.routes.login import login_bp
 from app.routes.shared.item_api import item_api_bp
+from app.routes.shared.event_stream import event_stream_bp
 from app.routes.project_logs import project_logs_bp
 from app.routes.issue_logs import issue_logs_bp
 from app.routes.report_issue import report_issue_bp
@@ -36,6 +37,7 @@ def init_routes(app):
     app.register_blueprint(report_issue_bp, url_prefix='/')
     app.register_blueprint(item_bp, url_prefix='/')
     app.register_blueprint(item_api_bp)
+    app.register_blueprint(event_stream_bp, url_prefix='/')
     app.register_blueprint(projects_bp, url_prefix='/')
     app.register_blueprint(data_analytics_bp, url_prefix='/')
     app.register_blueprint(add_stock_bp, url_prefix='/')
\ No newline at end of file
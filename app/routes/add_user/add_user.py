@@ -5,10 +5,8 @@ from flask import (
 from app.routes.login.login import login_required
 from app.routes.shared.utils import role_required
 from app.config.roles import ALLOWED_ROLES
-from datetime import datetime
-import uuid
 
-from app.google_sheets.sheets_service import append_row
+from app.google_sheets.sheets_service import add_user as add_user_row
 
 add_user_bp = Blueprint(
     'add_user',
@@ -32,16 +30,7 @@ def add_user():
             if not name or not email or not pin or not role:
                 return "Missing required fields", 400
 
-            user_data = [
-                str(uuid.uuid4()),  # id
-                datetime.utcnow().isoformat(),  # created_at ✅ move this up
-                name,  # name
-                email,  # email
-                pin,  # pin
-                role  # role
-            ]
-
-            append_row('users', user_data)
+            add_user_row(name, email, pin, role)
 
             flash("✅ User added!", "success")
             return redirect(url_for("view_users.view_users"))
@@ -6,7 +6,8 @@ from app.google_sheets.sheets_service import (
     get_all_items,
     get_item_by_id,
     insert_log,
-    get_sheet_values
+    get_sheet_values,
+    get_article_user_balances
 )
 
 catalog_bp = Blueprint(
@@ -15,6 +16,18 @@ catalog_bp = Blueprint(
     template_folder='.'
 )
 
+def _net_taken(article_numbers):
+    """
+    (article_number, user_name) -> taken minus returned for these articles:
+    the hot logs plus the totals carried forward from the archived ones,
+    summed in the database.
+    """
+    return {
+        (b["article_number"], b.get("user_name") or ""): int(b.get("net") or 0)
+        for b in get_article_user_balances(article_numbers)
+    }
+
+
 @catalog_bp.route('/inventory')
 def inventory_redirect():
     try:
@@ -67,26 +80,7 @@ def catalog_view():
 
         if zero_stock_items:
             article_numbers = [item["article_number"] for item in zero_stock_items]
-            logs_raw = get_sheet_values("logs", "A1:Z1000")
-            if not logs_raw:
-                logs = []
-            else:
-                headers = logs_raw[0]
-                logs = [
-                    dict(zip(headers, row)) for row in logs_raw[1:]
-                    if row and dict(zip(headers, row)).get("article_number") in article_numbers
-                ]
-
-            log_summary = {}
-            for log in logs:
-                key = (log["article_number"], log["user_name"])
-                qty = int(log.get("quantity", 0))
-                if log["action"] == "take":
-                    log_summary[key] = log_summary.get(key, 0) + qty
-                elif log["action"] == "return":
-                    log_summary[key] = log_summary.get(key, 0) - qty
-
-            for (article, user), net_qty in log_summary.items():
+            for (article, user), net_qty in _net_taken(article_numbers).items():
                 if net_qty > 0:
                     unreturned.append({
                         "article_number": article,
@@ -165,28 +159,11 @@ def check_zero_stock_items_logs():
 
         article_numbers = [item["article_number"] for item in zero_stock_items]
 
-        # Step 2: Fetch all logs
-        logs_raw = get_sheet_values("logs", "A1:Z1000")
-        if not logs_raw:
-            return jsonify({"message": "No logs found"}), 200
-
-        headers = logs_raw[0]
-        logs = [
-            dict(zip(headers, row)) for row in logs_raw[1:]
-            if row and dict(zip(headers, row)).get("article_number") in article_numbers
-        ]
-
-        # Step 3: Summarize log quantities
+        # Step 2-3: Net quantities per user (hot logs + archived carry-forward)
         unmatched = []
-        log_summary = {}
-
-        for log in logs:
-            key = (log["article_number"], log["user_name"])
-            qty = int(log.get("quantity", 0))
-            if log["action"] == "take":
-                log_summary[key] = log_summary.get(key, 0) + qty
-            elif log["action"] == "return":
-                log_summary[key] = log_summary.get(key, 0) - qty
+        log_summary = _net_taken(article_numbers)
+        if not log_summary:
+            return jsonify({"message": "No logs found"}), 200
 
         # Step 4: Identify unreturned items
         for (article, user), net_qty in log_summary.items():
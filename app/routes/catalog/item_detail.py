@@ -3,11 +3,31 @@ from flask import Blueprint, render_template, request, jsonify, session, send_fr
 import traceback
 from app.routes.login.login import login_required
 from app.routes.shared.utils import insert_log_entry
-from app.google_sheets.sheets_service import get_item_by_id
+from app.google_sheets.sheets_service import get_item_by_id, get_product_by_id_cached, get_item_history
+from app.routes.shared.cursors import encode_cursor, decode_cursor
+from app.routes.shared.timestamps import format_timestamps
 import os
 
 item_bp = Blueprint("item_detail", __name__, template_folder=".")
 
+HISTORY_PAGE_SIZE = 25
+
+
+def _history_rows(logs):
+    """History rows as displayed: local time, user name fallback."""
+    rows = [
+        {
+            "user_name": log.get("user_name") or "Unknown",
+            "action": log.get("action") or "",
+            "quantity": log.get("quantity"),
+            "status": log.get("status") or "",
+        }
+        for log in logs
+    ]
+    for row, formatted in zip(rows, format_timestamps(log.get("timestamp") for log in logs)):
+        row["formatted_timestamp"] = formatted
+    return rows
+
 # Route to serve the JS manually
 @item_bp.route("/take_item/take_item.js")
 def serve_take_item_js():
@@ -30,15 +50,45 @@ def serve_return_item_js():
 @login_required
 def item_detail(item_id):
     try:
-        item, logs = get_item_by_id(item_id)
-        for log in logs:
-            log["user_name"] = log.get("user_name", "Unknown")
+        # Product from the cache, only the first page of its history
+        item, logs, next_cursor = get_item_by_id(item_id, history_limit=HISTORY_PAGE_SIZE)
+        logs = _history_rows(logs)
 
         if request.headers.get("X-Requested-With") == "XMLHttpRequest":
-            return render_template("item_detail.html", item=item, logs=logs)
+            return render_template("item_detail.html", item=item, logs=logs, next_cursor=encode_cursor(next_cursor))
 
-        return render_template("item_detail.html", item=item, logs=logs, role=session.get("role"))
+        return render_template("item_detail.html", item=item, logs=logs, next_cursor=encode_cursor(next_cursor),
+                               role=session.get("role"))
     except Exception as e:
         print("❌ Error in /item/<id>:", e)
         traceback.print_exc()
         return jsonify({"error": str(e)}), 400
+
+
+@item_bp.route("/api/item/<string:item_id>/history", methods=["GET"])
+@login_required
+def item_history(item_id):
+    """
+    Next page of an item's history, newest first.
+
+    Query params: cursor (next_cursor of the previous page) and history=1
+    (include archived logs).
+    """
+    try:
+        cursor = decode_cursor(request.args.get("cursor"))
+    except (ValueError, TypeError):
+        return jsonify({"ok": False, "error": "Invalid cursor"}), 400
+
+    try:
+        item = get_product_by_id_cached(item_id)
+        if not item or not item.get("article_number"):
+            return jsonify({"ok": False, "error": "Item not found"}), 404
+
+        logs, next_cursor = get_item_history(
+            item["article_number"], after=cursor, limit=HISTORY_PAGE_SIZE,
+            include_history=request.args.get("history") == "1",
+        )
+        return jsonify({"ok": True, "rows": _history_rows(logs), "next_cursor": encode_cursor(next_cursor)}), 200
+    except Exception as e:
+        print("❌ Error in /api/item/<id>/history:", e)
+        return jsonify({"ok": False, "error": str(e)}), 500
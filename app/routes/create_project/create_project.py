@@ -5,8 +5,8 @@ from datetime import datetime
 from app.routes.login.login import login_required
 from app.routes.shared.utils import role_required
 from app.config.roles import ALLOWED_ROLES
-from app.google_sheets.sheets_service import get_sheet_values, append_row
-import json
+from app.google_sheets.sheets_service import list_users
+from app.google_sheets.sheets_service import create_project as create_project_row, search_projects
 import os
 import uuid
 
@@ -30,23 +30,30 @@ def create_project_js(filename):
 
 @create_project_bp.route("/api/projects", methods=["GET"])
 def get_projects():
-    try:
-        search = request.args.get("search", "").lower()
-
-        raw = get_sheet_values("projects", "A1:Z1000")
-        if not raw:
-            return jsonify([])
-
-        headers = raw[0]
-        projects = [dict(zip(headers, row)) for row in raw[1:] if len(row) >= len(headers)]
-
-        if search:
-            projects = [
-                p for p in projects
-                if search in (p.get("project_number") or "").lower()
-            ]
+    """
+    Project picker search.
 
-        return jsonify(projects)
+    Query params: search (matches project_number / customer_name), status,
+    limit (default 50, max 200), offset. Returns a JSON list; the total
+    number of matches is in the X-Total-Count header.
+    """
+    try:
+        try:
+            limit = int(request.args.get("limit", 50))
+            offset = int(request.args.get("offset", 0))
+        except ValueError:
+            return jsonify({"error": "limit and offset must be integers"}), 400
+
+        projects, total = search_projects(
+            search=request.args.get("search", ""),
+            status=request.args.get("status") or None,
+            limit=limit,
+            offset=offset,
+        )
+
+        response = jsonify(projects)
+        response.headers["X-Total-Count"] = str(total)
+        return response
 
     except Exception as e:
         print("❌ Error in /api/projects:", e)
@@ -70,20 +77,20 @@ def create_project_api():
         if not project_number:
             return jsonify({"success": False, "error": "Project number is required"}), 400
 
-        # Create project entry
+        # Create project entry (also indexes its members for /projects)
         project_id = str(uuid.uuid4())
-        append_row("projects", [
-            project_id,
-            project_number,
-            start_date,
-            end_date,
-            created_by,
-            datetime.utcnow().isoformat(),
-            "active",
-            json.dumps(workers),
-            json.dumps(items),
-            customer_name
-        ])
+        create_project_row({
+            "id": project_id,
+            "project_number": project_number,
+            "start_date": start_date,
+            "end_date": end_date,
+            "created_by": created_by,
+            "created_at": datetime.utcnow().isoformat(),
+            "status": "active",
+            "workers": workers,
+            "items": items,
+            "customer_name": customer_name,
+        })
 
         print("✅ Project created successfully")
         return jsonify({
@@ -105,22 +112,27 @@ def create_project_api():
 @create_project_bp.route("/api/get_workers", methods=["GET"])
 @login_required
 def get_workers():
-    try:
-        raw = get_sheet_values("users", "A1:Z1000")
-        if not raw:
-            return jsonify([])
+    """
+    Workers for the project form, from the cached user directory.
 
-        headers = raw[0]
-        users = [dict(zip(headers, row)) for row in raw[1:] if len(row) >= len(headers)]
+    Query params: search (name or email), limit, offset. Returns a JSON
+    list; the total number of matches is in the X-Total-Count header.
+    """
+    try:
+        try:
+            limit = int(request.args["limit"]) if request.args.get("limit") else None
+            offset = int(request.args.get("offset", 0))
+        except ValueError:
+            return jsonify({"error": "limit and offset must be integers"}), 400
 
-        workers = [
-            {"username": u.get("email"), "name": u.get("name")}
-            for u in users
-            if u.get("role") == "worker"
-        ]
+        users, total = list_users(role="worker", search=request.args.get("search", ""),
+                                  limit=limit, offset=offset)
+        workers = [{"username": u.get("email"), "name": u.get("name")} for u in users]
 
-        return jsonify(workers)
+        response = jsonify(workers)
+        response.headers["X-Total-Count"] = str(total)
+        return response
 
     except Exception as e:
         print("❌ Error in /api/get_workers:", e)
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
@@ -1,15 +1,23 @@
-from flask import render_template, request, send_file, Blueprint
-from app.google_sheets.sheets_service import get_sheet_values
+from flask import render_template, request, Blueprint
+from app.google_sheets.sheets_service import get_issue_reports, iter_table_rows
 from app.routes.login.login import login_required
 from app.routes.shared.utils import role_required
+from app.routes.shared.exports import export_options, export_response
 from app.config.roles import ALLOWED_ROLES
 
-import pandas as pd
-from io import BytesIO
-from datetime import datetime
-
 master_role = ALLOWED_ROLES[1]
 
+ISSUE_FIELDS = [
+    "id",
+    "issue",
+    "article_number",
+    "product_name",
+    "count",
+    "timestamp",
+    "user_name",
+    "created_at"
+]
+
 issue_logs_bp = Blueprint(
     'issue_logs',
     __name__,
@@ -24,28 +32,11 @@ def view_issue_logs():
         user_filter = request.args.get("user", "").lower()
         article_filter = request.args.get("article", "").lower()
 
-        raw_issues = get_sheet_values("issue_reports", "A1:Z1000")
-
-        expected_headers = [
-            "id",
-            "issue",
-            "article_number",
-            "product_name",
-            "count",  # ✅ Add count here
-            "timestamp",
-            "user_name",
-            "created_at"
+        issues = [
+            {h: row.get(h) if row.get(h) is not None else "" for h in ISSUE_FIELDS}
+            for row in get_issue_reports()
         ]
 
-        issues = []
-        if raw_issues and len(raw_issues) > 1:
-            headers = raw_issues[0]
-            for row in raw_issues[1:]:
-                row = row + [""] * (len(expected_headers) - len(row))
-                row = row[:len(expected_headers)]
-                issue = dict(zip(expected_headers, row))
-                issues.append(issue)
-
         if user_filter:
             issues = [i for i in issues if user_filter in (i.get("user_name") or "").lower()]
         if article_filter:
@@ -55,12 +46,7 @@ def view_issue_logs():
                    or article_filter in r.get("product_name", "").lower()
             ]
 
-        for issue in issues:
-            try:
-                issue['formatted_timestamp'] = datetime.fromisoformat(issue['timestamp']).strftime('%Y-%m-%d %H:%M')
-            except Exception:
-                issue['formatted_timestamp'] = issue['timestamp']
-
+        # Timestamps are converted while rendering (|localtime filter)
         return render_template("issue_logs.html", issues=issues)
 
     except Exception as e:
@@ -72,24 +58,20 @@ def view_issue_logs():
 @login_required
 @role_required(master_role)
 def export_issue_logs():
-    try:
-        raw_issues = get_sheet_values("issue_reports", "A1:Z1000")
+    """
+    Stream the issue reports as xlsx (default) or csv, oldest first.
 
-        if not raw_issues or len(raw_issues) < 2:
-            return "No issue logs to export.", 400
-
-        headers = raw_issues[0]
-        rows = raw_issues[1:]
-        df = pd.DataFrame([dict(zip(headers, row)) for row in rows])
-
-        output = BytesIO()
-        df.to_excel(output, index=False)
-        output.seek(0)
-
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M")
-        filename = f"issue_logs_export_{timestamp}.xlsx"
+    Query params: format (xlsx|csv), from, to (ISO dates) and columns
+    (comma separated subset of ISSUE_FIELDS).
+    """
+    try:
+        fmt, columns, date_from, date_to = export_options(request.args, ISSUE_FIELDS)
+    except ValueError as e:
+        return str(e), 400
 
-        return send_file(output, download_name=filename, as_attachment=True)
+    try:
+        rows = iter_table_rows("issue_reports", columns, date_from=date_from, date_to=date_to)
+        return export_response(rows, columns, fmt, "issue_logs_export", sheet_title="Issue logs")
 
     except Exception as e:
         print("❌ Error exporting issue logs:", e)
@@ -1,11 +1,12 @@
-from flask import Blueprint, render_template, request, send_file
-from app.google_sheets.sheets_service import get_sheet_values
-from app.google_sheets.sheets_service import get_all_items
+from flask import Blueprint, render_template, request, jsonify
+from app.google_sheets.sheets_service import get_logs_page, iter_table_rows, LOGS_TABLE, LOGS_WITH_HISTORY
+from app.google_sheets.sheets_service import get_products_by_articles
 from app.routes.login.login import login_required
 from app.routes.shared.utils import role_required
-import pandas as pd
-from io import BytesIO
-from datetime import datetime
+from app.routes.shared.timestamps import format_timestamps
+from app.routes.shared.exports import export_options, export_response
+from app.routes.shared.cursors import encode_cursor, decode_cursor
+from datetime import date
 
 from app.config.roles import ALLOWED_ROLES
 master_role = ALLOWED_ROLES[1]
@@ -17,138 +18,112 @@ logs_bp = Blueprint(
 )
 
 
+LOGS_PAGE_SIZE = 50
+LOG_FIELDS = ["id", "article_number", "quantity", "action", "user_name", "timestamp", "status", "project_ref"]
+
+
+def _log_filters(args):
+    """Filters from the query string; dates are validated ISO dates."""
+    filters = {
+        "user": args.get("user", ""),
+        "item": args.get("item", ""),
+        "action": (args.get("action") or "").strip().lower() or None,
+        "date_from": (args.get("from") or "").strip() or None,
+        "date_to": (args.get("to") or "").strip() or None,
+        # archived (older than the retention window) logs only on request
+        "include_history": args.get("history") == "1",
+    }
+    for key in ("date_from", "date_to"):
+        if filters[key]:
+            filters[key] = date.fromisoformat(filters[key]).isoformat()
+    if filters["action"] not in (None, "take", "return"):
+        raise ValueError("action must be take or return")
+    return filters
+
+
+def _logs_page(filters, cursor=None):
+    """(rows ready for display, next cursor token) for one page of logs."""
+    rows, next_cursor = get_logs_page(**filters, after=cursor, limit=LOGS_PAGE_SIZE)
+
+    # Product names for just this page's articles
+    names = get_products_by_articles([r.get("article_number") for r in rows], "product_name")
+
+    logs = []
+    for row in rows:
+        log = {h: row.get(h) if row.get(h) is not None else "" for h in LOG_FIELDS}
+        log["product_name"] = (names.get(str(log["article_number"])) or {}).get("product_name") or "Unknown"
+        logs.append(log)
+
+    # Local display time for the whole page in one pass (DISPLAY_TIMEZONE)
+    for log, formatted in zip(logs, format_timestamps(l["timestamp"] for l in logs)):
+        log["formatted_timestamp"] = formatted
+    return logs, encode_cursor(next_cursor)
+
+
 @logs_bp.route("/logs", endpoint='logs')
 @login_required
 def view_logs():
+    """
+    Logs page: the first page is rendered here, the rest is loaded from
+    /api/logs as the user scrolls (keyset pagination on timestamp, id).
+    """
     try:
-        user_filter = request.args.get("user", "").lower()
-        item_filter = request.args.get("item", "").lower()
-
-        raw_logs = get_sheet_values("logs", "A1:Z1000")
-
-        expected_headers = [
-            "id",
-            "article_number",
-            "quantity",
-            "action",
-            "user_name",
-            "timestamp",
-            "status",
-            "project_ref"
-        ]
-
-        logs = []
-        if raw_logs and len(raw_logs) > 1:
-            headers = raw_logs[0]
-            for row in raw_logs[1:]:
-                # Pad or trim rows to match the expected header count
-                row = row + [""] * (len(expected_headers) - len(row))
-                row = row[:len(expected_headers)]
-
-                # Ensure mapping matches the expected order
-                log = dict(zip(expected_headers, row))
-
-                logs.append(log)
-        # Fetch all products and map article_number -> product_name
-        products = get_all_items()
-        article_to_description = {
-            item["article_number"]: item.get("product_name", "")
-            for item in products
-        }
-
-        # Add product_name to each log
-        for log in logs:
-            log["product_name"] = article_to_description.get(log["article_number"], "Unknown")
-
-        # Apply filters
-        if user_filter:
-            logs = [l for l in logs if user_filter in (l.get("user_name") or "").lower()]
-        if item_filter:
-            logs = [
-                l for l in logs
-                if item_filter in (l.get("article_number") or "").lower()
-                   or item_filter in (l.get("product_name") or "").lower()
-            ]
-
-        # Sort logs
-        logs.sort(key=lambda x: x.get("timestamp", ""), reverse=True)
-
-        import pytz  # Add at top of the file
-
-        sweden_tz = pytz.timezone("Europe/Stockholm")  # Swedish timezone
-
-        for log in logs:
-            try:
-                # Parse original timestamp (assuming it's in UTC)
-                utc_dt = datetime.fromisoformat(log['timestamp']).replace(tzinfo=pytz.utc)
-
-                # Convert to Sweden local time
-                sweden_dt = utc_dt.astimezone(sweden_tz)
-
-                log['formatted_timestamp'] = sweden_dt.strftime('%Y-%m-%d %H:%M')
-            except Exception:
-                log['formatted_timestamp'] = log['timestamp']
-
-        # -------------------------------
-        # 🔎 Zero Stock Check
-        # -------------------------------
-        zero_stock_items = [
-            item for item in products
-            if str(item.get("stock", "0")).strip() in ["0", "0.0", ""]
-        ]
-
-        unreturned = []
-        if zero_stock_items:
-            article_numbers = [item["article_number"] for item in zero_stock_items]
-            zero_logs = [log for log in logs if log.get("article_number") in article_numbers]
-
-            log_summary = {}
-            for log in zero_logs:
-                key = (log["article_number"], log["user_name"])
-                qty = int(log.get("quantity", 0))
-                if log["action"] == "take":
-                    log_summary[key] = log_summary.get(key, 0) + qty
-                elif log["action"] == "return":
-                    log_summary[key] = log_summary.get(key, 0) - qty
-
-            for (article, user), net_qty in log_summary.items():
-                if net_qty > 0:
-                    name = article_to_description.get(article, "Unknown")
-                    unreturned.append({
-                        "article_number": article,
-                        "product_name": name,
-                        "user": user,
-                        "quantity": net_qty
-                    })
-
-        return render_template("logs.html", logs=logs, unreturned=unreturned)
+        filters = _log_filters(request.args)
+    except ValueError as e:
+        return str(e), 400
+
+    try:
+        logs, next_cursor = _logs_page(filters)
+        return render_template("logs.html", logs=logs, next_cursor=next_cursor, filters=filters)
 
     except Exception as e:
         print("❌ Error in /logs:", e)
         return str(e), 500
 
 
-@logs_bp.route("/export_logs", endpoint="export_logs")
+@logs_bp.route("/api/logs", methods=["GET"])
 @login_required
-@role_required()
-def export_logs():
+def api_logs():
+    """
+    JSON page of logs, newest first.
+
+    Query params: user, item, action (take|return), from, to (ISO dates),
+    history=1 (include archived logs) and cursor (the next_cursor of the
+    previous page).
+    """
     try:
-        raw_logs = get_sheet_values("logs", "A1:Z1000")
-        if not raw_logs or len(raw_logs) < 2:
-            return "No logs to export.", 400
+        filters = _log_filters(request.args)
+        cursor = decode_cursor(request.args.get("cursor"))
+    except (ValueError, TypeError):
+        return jsonify({"ok": False, "error": "Invalid filter or cursor"}), 400
 
-        headers = raw_logs[0]
-        rows = raw_logs[1:]
-        df = pd.DataFrame([dict(zip(headers, row)) for row in rows])
+    try:
+        logs, next_cursor = _logs_page(filters, cursor)
+        return jsonify({"ok": True, "rows": logs, "next_cursor": next_cursor}), 200
+    except Exception as e:
+        print("❌ Error in /api/logs:", e)
+        return jsonify({"ok": False, "error": str(e)}), 500
 
-        output = BytesIO()
-        df.to_excel(output, index=False)
-        output.seek(0)
 
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M")
-        filename = f"logs_export_{timestamp}.xlsx"
+@logs_bp.route("/export_logs", endpoint="export_logs")
+@login_required
+@role_required()
+def export_logs():
+    """
+    Stream the logs as xlsx (default) or csv, oldest first.
 
-        return send_file(output, download_name=filename, as_attachment=True)
+    Query params: format (xlsx|csv), from, to (ISO dates), columns
+    (comma separated subset of LOG_FIELDS) and history=1 (include archived logs).
+    """
+    try:
+        fmt, columns, date_from, date_to = export_options(request.args, LOG_FIELDS)
+    except ValueError as e:
+        return str(e), 400
+
+    try:
+        table = LOGS_WITH_HISTORY if request.args.get("history") == "1" else LOGS_TABLE
+        rows = iter_table_rows(table, columns, date_from=date_from, date_to=date_to)
+        return export_response(rows, columns, fmt, "logs_export", sheet_title="Logs")
 
     except Exception as e:
         print("❌ Error exporting logs:", e)
@@ -1,7 +1,6 @@
 from flask import Blueprint, render_template, session
-from app.google_sheets.sheets_service import get_sheet_values
-from datetime import datetime
-import json
+from app.google_sheets.sheets_service import get_projects_with_status, get_member_projects
+from app.routes.shared.project_items import json_list
 from app.config.roles import ALLOWED_ROLES
 
 project_logs_bp = Blueprint("project_logs", __name__, template_folder=".")
@@ -12,52 +11,31 @@ def project_logs():
     user_role = session.get("role")
     is_master = user_role == ALLOWED_ROLES[1]
 
-    raw = get_sheet_values("projects", "A1:Z1000")
-    if not raw or len(raw) < 2:
-        return render_template("project_logs.html", active=[], upcoming=[], completed=[])
-
-    headers = raw[0]
-    data = raw[1:]
+    # Bucket ("phase") and order come from the projects_with_status view;
+    # masters see every project, others the ones they are assigned to
+    if is_master:
+        rows = get_projects_with_status(order="start_sort")
+    else:
+        rows = get_member_projects([user_email], order="start_sort")
 
     active = []
     upcoming = []
     completed = []
+    buckets = {"active": active, "upcoming": upcoming}
 
-    for row in data:
-        project = dict(zip(headers, row))
+    for project in rows:
         try:
-            workers = json.loads(project.get("workers", "[]"))
-            items = json.loads(project.get("items", "[]"))
-
-            if not is_master:
-                if not any(user_email == w.get("username") for w in workers):
-                    continue
-
-            start_date = project.get("start_date", "")
-            end_date = project.get("end_date", "")
-            status = project.get("status", "active").lower()
-
-            try:
-                start_dt = datetime.strptime(start_date, "%Y-%m-%d")
-                end_dt = datetime.strptime(end_date, "%Y-%m-%d")
-                today = datetime.today()
+            workers = json_list(project.get("workers"))
+            items = json_list(project.get("items"))
 
-                if status == "completed":
-                    target_list = completed
-                elif today < start_dt:
-                    target_list = upcoming
-                elif start_dt <= today <= end_dt:
-                    target_list = active
-                else:
-                    target_list = completed if status == "completed" else active
-            except:
-                target_list = active
+            status = (project.get("status") or "active").lower()
+            target_list = buckets.get(project.get("phase"), completed)
 
             target_list.append({
                 "project_number": project.get("project_number", "N/A"),
                 "created_by": project.get("created_by", "Unknown"),
-                "start_date": start_date,
-                "end_date": end_date,
+                "start_date": project.get("start_date", ""),
+                "end_date": project.get("end_date", ""),
                 "workers": [w.get("name") or w.get("username") for w in workers],
                 "project_items": [{
                     "item_id": i.get("item_id", ""),
@@ -0,0 +1,17 @@
+import base64
+import json
+
+
+def encode_cursor(cursor):
+    """Opaque URL-safe token for a keyset cursor such as (timestamp, id)."""
+    if not cursor:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(list(cursor)).encode()).decode()
+
+
+def decode_cursor(token):
+    """(timestamp, id) from encode_cursor(); raises ValueError/TypeError on a bad token."""
+    if not token:
+        return None
+    ts, row_id = json.loads(base64.urlsafe_b64decode(token.encode()).decode())
+    return str(ts), str(row_id)
@@ -0,0 +1,43 @@
+import json
+
+from flask import Blueprint, Response, request, stream_with_context
+
+from app.config.roles import ALLOWED_ROLES
+from app.events import get_broker
+from app.routes.login.login import login_required
+from app.routes.shared.utils import role_required
+
+
+event_stream_bp = Blueprint('event_stream', __name__)
+
+master_role = ALLOWED_ROLES[1]
+
+
+@event_stream_bp.route("/events/stream", methods=["GET"])
+@login_required
+@role_required(master_role)
+def stream_events():
+    """
+    Server-Sent Events: stock_changed, safety_threshold_crossed and
+    movements_confirmed (see app/events).
+
+    Reconnecting browsers send Last-Event-ID and get the events they missed.
+    Each open stream holds a worker thread, so run gunicorn with threads.
+    """
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+
+    def generate():
+        yield "retry: 5000\n\n"
+        for entry in get_broker().listen(last_event_id):
+            if entry is None:
+                # Heartbeat; also makes a closed connection raise here
+                yield ": keep-alive\n\n"
+                continue
+            event_id, event, data = entry
+            yield f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,130 @@
+"""
+Streaming exports.
+
+Rows come from a lazy iterator (e.g. iter_table_rows()) and are written out
+as they arrive, so an export never holds the whole table in memory:
+
+  csv   chunked text/csv response, flushed every EXPORT_CSV_BATCH rows
+  xlsx  write-only openpyxl workbook spooled to a temp file, then streamed
+"""
+import csv
+import io
+import itertools
+import json
+import tempfile
+from datetime import date, datetime
+
+from flask import Response, stream_with_context
+
+EXPORT_FORMATS = ("xlsx", "csv")
+EXPORT_CSV_BATCH = 500
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def export_options(args, allowed_columns):
+    """
+    (format, columns, date_from, date_to) from the query string:
+
+      format   xlsx (default) or csv
+      columns  comma separated subset of allowed_columns (default: None,
+               every column the table has)
+      from/to  ISO dates, inclusive
+
+    Raises ValueError on anything else.
+    """
+    fmt = (args.get("format") or "xlsx").strip().lower()
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError("format must be xlsx or csv")
+
+    columns = [c.strip() for c in (args.get("columns") or "").split(",") if c.strip()]
+    unknown = [c for c in columns if c not in allowed_columns]
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+
+    dates = []
+    for key in ("from", "to"):
+        value = (args.get(key) or "").strip()
+        dates.append(date.fromisoformat(value).isoformat() if value else None)
+
+    return fmt, columns or None, dates[0], dates[1]
+
+
+def _cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def _csv_chunks(rows, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM so Excel opens the file as UTF-8
+    buffer.write("\ufeff")
+    writer.writerow(columns)
+
+    for n, row in enumerate(rows, 1):
+        writer.writerow([_cell(row.get(c)) for c in columns])
+        if n % EXPORT_CSV_BATCH == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _xlsx_file(rows, columns, sheet_title):
+    """Write the rows into a write-only workbook; returns the open temp file."""
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=sheet_title[:31])
+    ws.append(columns)
+    for row in rows:
+        ws.append([_cell(row.get(c)) for c in columns])
+
+    tmp = tempfile.TemporaryFile()
+    wb.save(tmp)
+    tmp.seek(0)
+    return tmp
+
+
+def _file_chunks(tmp):
+    try:
+        while True:
+            chunk = tmp.read(EXPORT_CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+    finally:
+        tmp.close()
+
+
+def export_response(rows, columns, fmt, basename, sheet_title="Export"):
+    """
+    Attachment response streaming `rows` (an iterator of dicts) as csv or
+    xlsx. Without `columns` the header is taken from the first row.
+    """
+    rows = iter(rows)
+    if not columns:
+        first = next(rows, None)
+        columns = list(first) if first else []
+        rows = itertools.chain([first], rows) if first else rows
+
+    filename = f"{basename}_{datetime.now().strftime('%Y%m%d_%H%M')}.{fmt}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+
+    if fmt == "csv":
+        return Response(
+            stream_with_context(_csv_chunks(rows, columns)),
+            mimetype="text/csv; charset=utf-8",
+            headers=headers,
+        )
+
+    tmp = _xlsx_file(rows, columns, sheet_title)
+    tmp.seek(0, io.SEEK_END)
+    headers["Content-Length"] = str(tmp.tell())
+    tmp.seek(0)
+    return Response(_file_chunks(tmp), mimetype=XLSX_MIMETYPE, headers=headers)
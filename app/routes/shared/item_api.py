@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify, session
 import traceback
 import json
 from app.routes.login.login import login_required
+from app import events
 
 from app.google_sheets.sheets_service import (
     get_all_items,
@@ -83,6 +84,13 @@ def confirm_items():
             # Log the event; store return_type in 'status' for reporting
             insert_log(art, qty, act, user_name, status=return_type)
 
+        events.publish(events.MOVEMENTS_CONFIRMED, {
+            "user_name": user_name,
+            "items": [
+                {"article_number": i.get("article_number"), "quantity": i.get("quantity"), "action": i.get("action", "take")}
+                for i in items
+            ],
+        })
         return "OK", 200
 
     except Exception:
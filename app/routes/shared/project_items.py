@@ -0,0 +1,59 @@
+import json
+
+from app.google_sheets.sheets_service import get_products_by_articles
+
+# Catalog columns shown next to each project line
+_CATALOG_COLUMNS = "article_number, location, unit, category, stock, product_image_url"
+
+
+def json_list(value, strict=False):
+    """
+    The dict entries of a project JSON column (workers, items, ...). The
+    columns arrive as jsonb lists or as (legacy) JSON text; empty text
+    gives [], a single object becomes a one-entry list.
+
+    Unparsable text or a non-list value gives [] too, unless `strict`:
+    then ValueError, so the caller can report the corrupt column.
+    """
+    if isinstance(value, str):
+        try:
+            value = json.loads(value.strip() or "[]")
+        except ValueError:
+            if strict:
+                raise
+            return []
+    if value is None:
+        return []
+    if isinstance(value, dict):
+        return [value]
+    if isinstance(value, list):
+        return [v for v in value if isinstance(v, dict)]
+    if strict:
+        raise ValueError(f"expected a JSON list, got {type(value).__name__}")
+    return []
+
+
+def enrich_project_items(items):
+    """
+    Join project lines ({item_id, item_name, quantity}) to the catalog.
+
+    Only the articles the project references are fetched, and each line is
+    matched through a dict keyed by article_number.
+    """
+    items = [i for i in (items or []) if isinstance(i, dict)]
+    catalog = get_products_by_articles([i.get("item_id") for i in items], _CATALOG_COLUMNS)
+
+    enriched = []
+    for item in items:
+        match = catalog.get(str(item.get("item_id") or "").strip(), {})
+        enriched.append({
+            "item_id": item.get("item_id"),
+            "item_name": item.get("item_name"),
+            "quantity": item.get("quantity"),
+            "location": match.get("location", "-"),
+            "unit": match.get("unit", "-"),
+            "type": match.get("category", "-"),  # `type` maps to your `category`
+            "available": match.get("stock", "-"),  # `available` maps to your `stock`
+            "image_url": match.get("product_image_url", "")
+        })
+    return enriched
@@ -0,0 +1,40 @@
+import os
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+import pandas as pd
+
+# Timestamps are stored in UTC and shown in this zone
+DISPLAY_TIMEZONE = os.getenv("DISPLAY_TIMEZONE", "Europe/Oslo")
+DISPLAY_FORMAT = "%Y-%m-%d %H:%M"
+
+
+@lru_cache(maxsize=None)
+def get_zone(name=None):
+    return ZoneInfo(name or DISPLAY_TIMEZONE)
+
+
+def format_timestamps(values, fmt=DISPLAY_FORMAT, tz=None):
+    """
+    Format a whole column of ISO timestamps in the display timezone in one
+    vectorized pass. Naive values are taken as UTC; unparseable values are
+    returned unchanged.
+    """
+    values = list(values)
+    if not values:
+        return []
+    raw = pd.Series(values, dtype="object")
+    parsed = pd.to_datetime(raw, errors="coerce", utc=True, format="ISO8601")
+    formatted = parsed.dt.tz_convert(get_zone(tz)).dt.strftime(fmt)
+    return formatted.where(parsed.notna(), raw.fillna("")).tolist()
+
+
+def format_timestamp(value, fmt=DISPLAY_FORMAT, tz=None):
+    """Jinja filter `localtime`: one timestamp, formatted while rendering."""
+    if value in (None, ""):
+        return ""
+    return format_timestamps([value], fmt, tz)[0]
+
+
+def init_timestamp_filters(app):
+    app.add_template_filter(format_timestamp, "localtime")
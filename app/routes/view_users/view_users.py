@@ -1,10 +1,11 @@
 from flask import (
     Blueprint,
-    render_template, request, flash, redirect, url_for
+    render_template, request, flash, redirect, url_for, jsonify
 )
 from app.routes.login.login import login_required
 from app.routes.shared.utils import role_required
-from app.google_sheets.sheets_service import get_sheet_values, write_cell
+from app.google_sheets.sheets_service import list_users, get_users_by_ids
+from app.google_sheets.sheets_service import update_user as update_user_row
 from app.config.roles import ALLOWED_ROLES
 
 master_role = ALLOWED_ROLES[1]
@@ -16,30 +17,57 @@ view_users_bp = Blueprint(
 )
 
 
+USERS_PAGE_SIZE = 50
+
+
 @view_users_bp.route("/view_users", methods=["GET"], endpoint="view_users")
 @login_required
 @role_required(master_role)
 def view_users():
     try:
-        values = get_sheet_values("users", "A1:Z1000")
-        if not values or len(values) < 2:
-            return render_template("view_users.html", users=[])
-
-        headers = values[0]
-        users = [dict(zip(headers, row)) for row in values[1:] if row]
-        return render_template("view_users.html", users=users)
+        search = (request.args.get("search") or "").strip()
+        page = max(request.args.get("page", 1, type=int) or 1, 1)
+        users, total = list_users(
+            search=search,
+            limit=USERS_PAGE_SIZE,
+            offset=(page - 1) * USERS_PAGE_SIZE,
+            include_pin=True,
+        )
+        # The directory only orders and pages; the edit forms get the current
+        # rows, whose updated_at is the version update_user() checks
+        fresh = get_users_by_ids([u.get("id") for u in users])
+        users = [fresh[str(u.get("id"))] for u in users if str(u.get("id")) in fresh]
+        pages = max((total + USERS_PAGE_SIZE - 1) // USERS_PAGE_SIZE, 1)
+        return render_template("view_users.html", users=users, search=search,
+                               page=page, pages=pages, total=total)
 
     except Exception as e:
         print("❌ Error in /view_users:", e)
         return str(e), 500
 
-def index_to_column_letter(index):
-    """Convert a 0-based column index to a column letter (e.g., 0 -> A, 27 -> AB)."""
-    result = ""
-    while index >= 0:
-        result = chr(index % 26 + ord('A')) + result
-        index = index // 26 - 1
-    return result
+
+@view_users_bp.route("/api/users", methods=["GET"])
+@login_required
+@role_required(master_role)
+def api_users():
+    """
+    JSON page of the user directory (no PINs).
+
+    Query params: role, search (name or email), page, page_size (max 200).
+    """
+    try:
+        page = max(request.args.get("page", 1, type=int) or 1, 1)
+        page_size = min(max(request.args.get("page_size", 50, type=int) or 50, 1), 200)
+        users, total = list_users(
+            role=request.args.get("role") or None,
+            search=request.args.get("search", ""),
+            limit=page_size,
+            offset=(page - 1) * page_size,
+        )
+        return jsonify({"ok": True, "rows": users, "total": total, "page": page, "page_size": page_size}), 200
+    except Exception as e:
+        print("❌ Error in /api/users:", e)
+        return jsonify({"ok": False, "error": str(e)}), 500
 
 @view_users_bp.route("/update_user", methods=["POST"], endpoint="update_user")
 @login_required
@@ -51,31 +79,12 @@ def update_user():
         email = request.form.get("email")
         role = request.form.get("role")
         pin = request.form.get("pin")
+        version = request.form.get("version") or None
 
         if not user_id or not name or not email or not role:
             flash("All cells must be filled.", "danger")
             return redirect(url_for("view_users.view_users"))
 
-        # Read the sheet
-        values = get_sheet_values("users", "A1:Z1000")
-        if not values:
-            flash("❌ Error when reading users file.", "danger")
-            return redirect(url_for("view_users.view_users"))
-
-        headers = values[0]
-        id_col = headers.index("id")
-        row_to_update = None
-
-        for idx, row in enumerate(values[1:], start=2):  # row 2 = first user row
-            row += [""] * (len(headers) - len(row))  # pad short rows
-            if row[id_col] == user_id:
-                row_to_update = idx
-                break
-
-        if not row_to_update:
-            flash("❌ User not found.", "danger")
-            return redirect(url_for("view_users.view_users"))
-
         # Update specified fields
         updates = {
             "name": name,
@@ -85,12 +94,10 @@ def update_user():
         if pin:
             updates["pin"] = pin
 
-        for key, val in updates.items():
-            if key in headers:
-                col_idx = headers.index(key)
-                col_letter = index_to_column_letter(col_idx)
-                cell = f"{col_letter}{row_to_update}"
-                write_cell("users", cell, val)
+        # One request for the whole row; rejected if someone else edited the user meanwhile
+        if update_user_row(user_id, updates, expected_version=version) is None:
+            flash("❌ User not found or changed by someone else. Reload and try again.", "danger")
+            return redirect(url_for("view_users.view_users"))
 
         flash("✅ User information updated.", "success")
 
@@ -0,0 +1,35 @@
+-- Consolidated project movements read by /data_analytics (one row per project line).
+-- Run once in the Supabase SQL editor.
+
+create table if not exists public.data_analytics (
+    id                 uuid primary key default gen_random_uuid(),
+    article_number     text not null default '',
+    order_time         text not null default '',
+    order_status       text,
+    warehouse          text,
+    driller            text,
+    project_number     text not null default '',
+    pickup_time        text,
+    item_name          text,
+    projected_quantity integer not null default 0,
+    taken_quantity     integer not null default 0,
+    returned_quantity  integer not null default 0,
+    comments           text
+);
+
+-- Composite key used by the export job
+create unique index if not exists data_analytics_key_idx
+    on public.data_analytics (article_number, project_number, order_time);
+
+-- Default ordering of the paged table
+create index if not exists data_analytics_order_time_idx
+    on public.data_analytics (order_time desc, project_number, article_number);
+
+-- Substring filters (ilike '%...%') on the paged table
+create extension if not exists pg_trgm;
+create index if not exists data_analytics_project_trgm_idx
+    on public.data_analytics using gin (project_number gin_trgm_ops);
+create index if not exists data_analytics_driller_trgm_idx
+    on public.data_analytics using gin (driller gin_trgm_ops);
+create index if not exists data_analytics_article_trgm_idx
+    on public.data_analytics using gin (article_number gin_trgm_ops);
@@ -0,0 +1,28 @@
+-- Change tracking for the projects -> data_analytics export job.
+-- Run once in the Supabase SQL editor.
+
+alter table public.projects
+    add column if not exists updated_at timestamptz not null default now();
+
+create or replace function public.touch_updated_at() returns trigger
+language plpgsql as $$
+begin
+    new.updated_at := now();
+    return new;
+end;
+$$;
+
+drop trigger if exists projects_touch_updated_at on public.projects;
+create trigger projects_touch_updated_at
+    before update on public.projects
+    for each row execute function public.touch_updated_at();
+
+create index if not exists projects_updated_at_idx on public.projects (updated_at);
+
+-- One row per background job: last run time, watermark and counts
+create table if not exists public.sync_state (
+    key            text primary key,
+    watermark      text,
+    last_synced_at timestamptz,
+    details        jsonb not null default '{}'::jsonb
+);
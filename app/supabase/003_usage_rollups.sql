@@ -0,0 +1,27 @@
+-- Daily usage rollup: day x article x user x action -> quantity.
+-- Maintained by insert_log() through bump_usage_rollup(); rebuilt with
+-- `flask backfill-usage-rollups`. Days are UTC dates of logs.timestamp.
+
+create table if not exists public.usage_daily_rollup (
+    day            date    not null,
+    article_number text    not null,
+    user_name      text    not null default '',
+    action         text    not null,
+    quantity       bigint  not null default 0,
+    movements      integer not null default 0,
+    primary key (day, article_number, user_name, action)
+);
+
+create index if not exists usage_daily_rollup_action_day_idx
+    on public.usage_daily_rollup (action, day);
+
+create or replace function public.bump_usage_rollup(
+    p_day date, p_article_number text, p_user_name text, p_action text, p_quantity bigint
+) returns void
+language sql as $$
+    insert into public.usage_daily_rollup (day, article_number, user_name, action, quantity, movements)
+    values (p_day, p_article_number, coalesce(p_user_name, ''), p_action, p_quantity, 1)
+    on conflict (day, article_number, user_name, action) do update
+        set quantity  = usage_daily_rollup.quantity + excluded.quantity,
+            movements = usage_daily_rollup.movements + 1;
+$$;
@@ -0,0 +1,14 @@
+-- products.updated_at moves on every stock/comment change, so analytics
+-- caches can use it as a watermark. Reuses touch_updated_at() from 002.
+
+alter table public.products
+    add column if not exists updated_at timestamptz not null default now();
+
+drop trigger if exists products_touch_updated_at on public.products;
+create trigger products_touch_updated_at
+    before update on public.products
+    for each row execute function public.touch_updated_at();
+
+create index if not exists products_updated_at_idx on public.products (updated_at desc);
+create index if not exists logs_timestamp_idx on public.logs (timestamp desc);
+create index if not exists issue_reports_timestamp_idx on public.issue_reports (timestamp desc);
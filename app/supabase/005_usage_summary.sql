@@ -0,0 +1,38 @@
+-- Period x dimension usage totals for /api/analytics/usage, grouped in the
+-- database from usage_daily_rollup (003). Uses the (action, day) index.
+
+create index if not exists products_article_number_idx on public.products (article_number);
+
+create or replace function public.usage_summary(
+    p_from date,
+    p_to date,
+    p_group_by text,              -- 'day' | 'week' | 'month'
+    p_by text,                    -- 'user' | 'article' | 'category'
+    p_action text default 'take'  -- null = every action
+) returns table (period date, key text, label text, quantity bigint, movements bigint)
+language sql stable as $$
+    with base as (
+        select
+            date_trunc(p_group_by, r.day::timestamp)::date as period,
+            case p_by
+                when 'user'    then r.user_name
+                when 'article' then r.article_number
+                else coalesce(nullif(p.category, ''), 'Undecided')
+            end as key,
+            case p_by
+                when 'article' then coalesce(nullif(p.product_name, ''), r.article_number)
+                when 'user'    then r.user_name
+                else coalesce(nullif(p.category, ''), 'Undecided')
+            end as label,
+            r.quantity,
+            r.movements
+        from public.usage_daily_rollup r
+        left join public.products p on p.article_number = r.article_number
+        where r.day between p_from and p_to
+          and (p_action is null or r.action = p_action)
+    )
+    select period, key, max(label), sum(quantity)::bigint, sum(movements)::bigint
+    from base
+    group by period, key
+    order by period, 4 desc;
+$$;
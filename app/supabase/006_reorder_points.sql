@@ -0,0 +1,21 @@
+-- Suggested reorder points, one row per article.
+-- Written by `flask compute-reorder-points` / the reorder_points job
+-- (app/analytics/reorder.py); read by the analytics page.
+
+create table if not exists public.reorder_points (
+    article_number   text primary key,
+    stock            integer          not null default 0,
+    daily_rate       double precision not null default 0,  -- mean takes per day over the window
+    daily_std        double precision not null default 0,  -- std-dev of daily takes
+    days_of_cover    double precision,                      -- null when nothing is consumed
+    safety_stock     integer          not null default 0,  -- suggested, from z * std * sqrt(lead time)
+    reorder_point    integer          not null default 0,
+    pending_delivery boolean          not null default false,
+    needs_reorder    boolean          not null default false,
+    window_days      integer          not null,
+    lead_time_days   integer          not null,
+    computed_at      timestamptz      not null default now()
+);
+
+create index if not exists reorder_points_computed_at_idx on public.reorder_points (computed_at desc);
+create index if not exists reorder_points_needs_reorder_idx on public.reorder_points (needs_reorder) where needs_reorder;
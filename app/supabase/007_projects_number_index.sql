@@ -0,0 +1,7 @@
+-- One project per project_number, and an index for the single-project
+-- lookups in get_project_by_number(). Fails if duplicates exist; resolve
+-- them first:
+--   select project_number, count(*) from public.projects group by 1 having count(*) > 1;
+
+create unique index if not exists projects_project_number_key
+    on public.projects (project_number);
@@ -0,0 +1,13 @@
+-- Who can see which project: one row per (project, identifier), where the
+-- identifiers are the lowercased username / email / name of every assigned
+-- worker plus created_by. Maintained by create_project() / update_project();
+-- rebuild with `flask backfill-project-members`.
+
+create table if not exists public.project_members (
+    project_id uuid not null references public.projects (id) on delete cascade,
+    member_key text not null,
+    primary key (project_id, member_key)
+);
+
+create index if not exists project_members_member_key_idx on public.project_members (member_key);
+create index if not exists projects_status_idx on public.projects (status);
@@ -0,0 +1,90 @@
+-- Project JSON columns as jsonb, and an append-only write for worker movements.
+-- append_project_movements() adds the new lines inside the database under the
+-- row lock, so concurrent takes/returns on one project no longer overwrite
+-- each other and the client sends only the new lines, not the history.
+--
+-- Legacy cells that are not valid JSON (Python reprs from the Sheets era,
+-- e.g. "[{'item_id': '1'}]") are never dropped: run `flask
+-- repair-project-json` first, which rewrites them as JSON. If any cell
+-- still does not parse, this migration aborts before changing anything and
+-- names the projects, so they can be fixed by hand.
+
+create or replace function public._is_json(p_value text) returns boolean
+language plpgsql immutable as $$
+begin
+    perform p_value::jsonb;
+    return true;
+exception
+    when invalid_text_representation then
+        return false;
+end;
+$$;
+
+do $$
+declare
+    col text;
+    v_bad text;
+begin
+    foreach col in array array['workers', 'items', 'taken_by_worker', 'returned_by_worker'] loop
+        if exists (
+            select 1 from information_schema.columns
+            where table_schema = 'public' and table_name = 'projects'
+              and column_name = col and data_type <> 'jsonb'
+        ) then
+            execute format(
+                'select string_agg(coalesce(project_number, id::text), '', '' order by project_number) '
+                'from public.projects '
+                'where nullif(trim(%I::text), '''') is not null and not public._is_json(%I::text)',
+                col, col
+            ) into v_bad;
+            if v_bad is not null then
+                raise exception 'projects.% is not valid JSON for projects: % (run flask repair-project-json)',
+                    col, v_bad;
+            end if;
+        end if;
+    end loop;
+
+    foreach col in array array['workers', 'items', 'taken_by_worker', 'returned_by_worker'] loop
+        if exists (
+            select 1 from information_schema.columns
+            where table_schema = 'public' and table_name = 'projects'
+              and column_name = col and data_type <> 'jsonb'
+        ) then
+            execute format(
+                'alter table public.projects alter column %I type jsonb '
+                'using coalesce(nullif(trim(%I::text), ''''), ''[]'')::jsonb',
+                col, col
+            );
+        end if;
+        execute format('alter table public.projects alter column %I set default ''[]''::jsonb', col);
+    end loop;
+end;
+$$;
+
+create or replace function public.append_project_movements(
+    p_project_number text, p_kind text, p_items jsonb
+) returns boolean
+language plpgsql as $$
+declare
+    v_id uuid;
+begin
+    if p_kind not in ('taken', 'returned') then
+        raise exception 'p_kind must be taken or returned, got %', p_kind;
+    end if;
+    if jsonb_typeof(p_items) <> 'array' then
+        raise exception 'p_items must be a JSON array';
+    end if;
+
+    update public.projects
+       set taken_by_worker = case when p_kind = 'taken'
+                                  then coalesce(taken_by_worker, '[]'::jsonb) || p_items
+                                  else taken_by_worker end,
+           returned_by_worker = case when p_kind = 'returned'
+                                     then coalesce(returned_by_worker, '[]'::jsonb) || p_items
+                                     else returned_by_worker end
+     where project_number = p_project_number
+    returning id into v_id;
+
+    return v_id is not null;
+end;
+$$;
@@ -0,0 +1,139 @@
+-- Per-project, per-article totals: projected / taken / returned, and the
+-- returns split by type (used / broken). The project pages render from here.
+--   * items changes (create / edit project): full refresh of that project (trigger)
+--   * worker movements: added incrementally by append_project_movements()
+-- Rebuild everything with `flask backfill-project-summaries`.
+
+create table if not exists public.project_item_summaries (
+    project_id     uuid    not null references public.projects (id) on delete cascade,
+    article_number text    not null,
+    item_name      text    not null default '',
+    planned        boolean not null default false,  -- listed in projects.items
+    projected      integer not null default 0,
+    taken          integer not null default 0,
+    returned       integer not null default 0,      -- every return line
+    used           integer not null default 0,      -- return_type = 'used'
+    broken         integer not null default 0,      -- return_type = 'broken'
+    primary key (project_id, article_number)
+);
+
+-- Quantity of one JSON line; lines without a usable quantity count as `dflt`
+create or replace function public._line_qty(line jsonb, dflt integer) returns integer
+language sql immutable as $$
+    select case when (line->>'quantity') ~ '^\s*-?\d+\s*$' then (line->>'quantity')::integer else dflt end;
+$$;
+
+create or replace function public.refresh_project_item_summaries(p_project_id uuid default null)
+returns integer
+language plpgsql as $$
+declare
+    v_rows integer;
+begin
+    delete from public.project_item_summaries
+     where p_project_id is null or project_id = p_project_id;
+
+    insert into public.project_item_summaries
+        (project_id, article_number, item_name, planned, projected, taken, returned, used, broken)
+    select l.project_id,
+           l.article_number,
+           coalesce(max(nullif(l.item_name, '')), ''),
+           bool_or(l.kind = 'items'),
+           coalesce(sum(l.qty) filter (where l.kind = 'items'), 0),
+           coalesce(sum(l.qty) filter (where l.kind = 'taken'), 0),
+           coalesce(sum(l.qty) filter (where l.kind = 'returned'), 0),
+           coalesce(sum(l.qty) filter (where l.kind = 'returned' and l.return_type = 'used'), 0),
+           coalesce(sum(l.qty) filter (where l.kind = 'returned' and l.return_type = 'broken'), 0)
+      from (
+            select p.id as project_id, k.kind,
+                   trim(e->>'item_id') as article_number,
+                   trim(coalesce(e->>'item_name', '')) as item_name,
+                   lower(trim(coalesce(e->>'return_type', ''))) as return_type,
+                   public._line_qty(e, case when k.kind = 'items' then 0 else 1 end) as qty
+              from public.projects p
+              cross join lateral (values
+                    ('items', p.items),
+                    ('taken', p.taken_by_worker),
+                    ('returned', p.returned_by_worker)) as k(kind, lines)
+              cross join lateral jsonb_array_elements(
+                    case when jsonb_typeof(k.lines) = 'array' then k.lines else '[]'::jsonb end) as e
+             where (p_project_id is null or p.id = p_project_id)
+               and jsonb_typeof(e) = 'object'
+           ) l
+     where l.article_number <> ''
+     group by l.project_id, l.article_number;
+
+    get diagnostics v_rows = row_count;
+    return v_rows;
+end;
+$$;
+
+create or replace function public.projects_refresh_item_summaries() returns trigger
+language plpgsql as $$
+begin
+    perform public.refresh_project_item_summaries(new.id);
+    return new;
+end;
+$$;
+
+drop trigger if exists projects_item_summaries on public.projects;
+create trigger projects_item_summaries
+    after insert or update of items on public.projects
+    for each row execute function public.projects_refresh_item_summaries();
+
+-- Same append as 009, now also adding the new lines to the summaries
+create or replace function public.append_project_movements(
+    p_project_number text, p_kind text, p_items jsonb
+) returns boolean
+language plpgsql as $$
+declare
+    v_id uuid;
+begin
+    if p_kind not in ('taken', 'returned') then
+        raise exception 'p_kind must be taken or returned, got %', p_kind;
+    end if;
+    if jsonb_typeof(p_items) <> 'array' then
+        raise exception 'p_items must be a JSON array';
+    end if;
+
+    update public.projects
+       set taken_by_worker = case when p_kind = 'taken'
+                                  then coalesce(taken_by_worker, '[]'::jsonb) || p_items
+                                  else taken_by_worker end,
+           returned_by_worker = case when p_kind = 'returned'
+                                     then coalesce(returned_by_worker, '[]'::jsonb) || p_items
+                                     else returned_by_worker end
+     where project_number = p_project_number
+    returning id into v_id;
+
+    if v_id is null then
+        return false;
+    end if;
+
+    insert into public.project_item_summaries as s
+        (project_id, article_number, item_name, taken, returned, used, broken)
+    select v_id,
+           trim(e->>'item_id'),
+           coalesce(max(nullif(trim(coalesce(e->>'item_name', '')), '')), ''),
+           case when p_kind = 'taken' then sum(public._line_qty(e, 1)) else 0 end,
+           case when p_kind = 'returned' then sum(public._line_qty(e, 1)) else 0 end,
+           case when p_kind = 'returned'
+                then coalesce(sum(public._line_qty(e, 1)) filter (where lower(e->>'return_type') = 'used'), 0)
+                else 0 end,
+           case when p_kind = 'returned'
+                then coalesce(sum(public._line_qty(e, 1)) filter (where lower(e->>'return_type') = 'broken'), 0)
+                else 0 end
+      from jsonb_array_elements(p_items) e
+     where jsonb_typeof(e) = 'object' and trim(coalesce(e->>'item_id', '')) <> ''
+     group by trim(e->>'item_id')
+    on conflict (project_id, article_number) do update
+        set taken     = s.taken + excluded.taken,
+            returned  = s.returned + excluded.returned,
+            used      = s.used + excluded.used,
+            broken    = s.broken + excluded.broken,
+            item_name = case when s.item_name = '' then excluded.item_name else s.item_name end;
+
+    return true;
+end;
+$$;
+
+select public.refresh_project_item_summaries();
@@ -0,0 +1,10 @@
+-- Server-side project search for /api/projects (search_projects()):
+-- substring / prefix matches on project_number and customer_name.
+-- pg_trgm is enabled in 001.
+
+create index if not exists projects_project_number_trgm_idx
+    on public.projects using gin (project_number gin_trgm_ops);
+create index if not exists projects_customer_name_trgm_idx
+    on public.projects using gin (customer_name gin_trgm_ops);
+create index if not exists projects_status_number_idx
+    on public.projects (status, project_number);
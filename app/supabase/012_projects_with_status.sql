@@ -0,0 +1,41 @@
+-- Typed project dates and the derived status ("phase"), computed in the database.
+--
+-- start_on / end_on are generated from the YYYY-MM-DD text columns (null when
+-- unparseable). projects_with_status adds:
+--   phase       the stored status when it is not 'active' (finished, completed, ...);
+--               otherwise 'upcoming' before start_on, else 'active'
+--   start_sort  start_on, unknown dates last when ascending
+--   end_sort    end_on, unknown dates last when descending
+
+create or replace function public.safe_iso_date(value text) returns date
+language plpgsql immutable as $$
+begin
+    if value !~ '^\s*\d{4}-\d{2}-\d{2}' then
+        return null;
+    end if;
+    value := trim(value);
+    return make_date(substr(value, 1, 4)::int, substr(value, 6, 2)::int, substr(value, 9, 2)::int);
+exception when others then
+    return null;
+end;
+$$;
+
+alter table public.projects
+    add column if not exists start_on date generated always as (public.safe_iso_date(start_date::text)) stored,
+    add column if not exists end_on   date generated always as (public.safe_iso_date(end_date::text)) stored;
+
+create index if not exists projects_start_on_idx on public.projects (start_on);
+create index if not exists projects_end_on_idx on public.projects (end_on desc);
+
+create or replace view public.projects_with_status as
+select p.*,
+       case
+           when lower(coalesce(nullif(trim(p.status), ''), 'active')) <> 'active'
+               then lower(trim(p.status))
+           when p.start_on is not null and p.end_on is not null and current_date < p.start_on
+               then 'upcoming'
+           else 'active'
+       end as phase,
+       coalesce(p.start_on, 'infinity'::date)  as start_sort,
+       coalesce(p.end_on, '-infinity'::date)   as end_sort
+  from public.projects p;
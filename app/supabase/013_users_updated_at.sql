@@ -0,0 +1,10 @@
+-- users.updated_at: version for optimistic updates in update_user().
+-- Reuses touch_updated_at() from 002.
+
+alter table public.users
+    add column if not exists updated_at timestamptz not null default now();
+
+drop trigger if exists users_touch_updated_at on public.users;
+create trigger users_touch_updated_at
+    before update on public.users
+    for each row execute function public.touch_updated_at();
@@ -0,0 +1,9 @@
+-- Indexes for the keyset-paginated logs page (get_logs_page()):
+-- newest first on (timestamp, id), with the pushed-down filters.
+
+create index if not exists logs_timestamp_id_idx on public.logs (timestamp desc, id desc);
+create index if not exists logs_article_timestamp_idx on public.logs (article_number, timestamp desc);
+create index if not exists logs_action_timestamp_idx on public.logs (action, timestamp desc);
+create index if not exists logs_user_name_trgm_idx on public.logs using gin (user_name gin_trgm_ops);
+create index if not exists logs_article_trgm_idx on public.logs using gin (article_number gin_trgm_ops);
+create index if not exists products_product_name_trgm_idx on public.products using gin (product_name gin_trgm_ops);
@@ -0,0 +1,4 @@
+-- Keyset index for the streamed issue report export (iter_table_rows()),
+-- oldest first on (timestamp, id). logs already has logs_timestamp_id_idx (014).
+
+create index if not exists issue_reports_timestamp_id_idx on public.issue_reports (timestamp, id);
@@ -0,0 +1,73 @@
+-- Hot/cold split of the logs: rows older than the retention window move to
+-- logs_archive (`flask archive-logs`, or the scheduled job). Readers query the
+-- hot 'logs' table unless they ask for history ('logs_all' = both).
+--
+-- Balances stay intact: every archived row is also added to
+-- logs_archived_balances, the carried-forward take/return totals per
+-- article and user, which the balance readers add to the hot rows.
+
+-- Same columns, keys and indexes as logs (keyset, article and search indexes)
+create table if not exists public.logs_archive (like public.logs including all);
+
+create index if not exists logs_archive_user_name_idx on public.logs_archive (user_name);
+
+create table if not exists public.logs_archived_balances (
+    article_number text        not null,
+    user_name      text        not null default '',
+    taken          bigint      not null default 0,
+    returned       bigint      not null default 0,
+    archived_rows  bigint      not null default 0,
+    last_at        timestamptz,
+    primary key (article_number, user_name)
+);
+
+create index if not exists logs_archived_balances_user_idx on public.logs_archived_balances (user_name);
+
+create or replace view public.logs_all as
+    select * from public.logs
+    union all
+    select * from public.logs_archive;
+
+-- Move up to p_batch rows older than p_before into the archive, in one
+-- transaction with their balance carry-forward. Returns the rows moved;
+-- call again until it returns less than p_batch.
+create or replace function public.archive_logs(p_before timestamptz, p_batch integer default 5000)
+returns integer
+language plpgsql as $$
+declare
+    v_rows integer;
+begin
+    with moved as (
+        delete from public.logs l
+         where l.id in (
+                select id from public.logs
+                 where "timestamp"::timestamptz < p_before
+                 order by "timestamp", id
+                 limit p_batch)
+        returning l.*
+    ), archived as (
+        insert into public.logs_archive
+        select * from moved
+        returning article_number, user_name, action, quantity, "timestamp"
+    ), carried as (
+        insert into public.logs_archived_balances as b
+            (article_number, user_name, taken, returned, archived_rows, last_at)
+        select coalesce(article_number, ''),
+               coalesce(user_name, ''),
+               coalesce(sum(quantity::bigint) filter (where action = 'take'), 0),
+               coalesce(sum(quantity::bigint) filter (where action = 'return'), 0),
+               count(*),
+               max("timestamp"::timestamptz)
+          from archived
+         group by 1, 2
+        on conflict (article_number, user_name) do update
+            set taken         = b.taken + excluded.taken,
+                returned      = b.returned + excluded.returned,
+                archived_rows = b.archived_rows + excluded.archived_rows,
+                last_at       = greatest(b.last_at, excluded.last_at)
+    )
+    select count(*) into v_rows from archived;
+
+    return v_rows;
+end;
+$$;
@@ -0,0 +1,91 @@
+-- Last activity on products, so the catalog and detail views show who last
+-- took an item and when it last moved without reading the logs.
+--   * every movement: record_product_activity(), called by insert_log()
+--   * takes_30d decays with time: refresh_product_takes_30d() (daily job)
+-- Rebuild everything with `flask backfill-product-activity`.
+
+alter table public.products
+    add column if not exists last_movement_at timestamptz,
+    add column if not exists last_taken_by    text,
+    add column if not exists last_returned_at timestamptz,
+    add column if not exists takes_30d        bigint not null default 0;
+
+-- Per-article takes over a day range (the PK leads with day)
+create index if not exists usage_daily_rollup_article_action_day_idx
+    on public.usage_daily_rollup (article_number, action, day);
+
+-- Units taken in the last 30 UTC days, from the daily rollup
+create or replace function public._takes_30d(p_article_number text) returns bigint
+language sql stable as $$
+    select coalesce(sum(quantity), 0)::bigint
+      from public.usage_daily_rollup
+     where article_number = p_article_number
+       and action = 'take'
+       and day > (now() at time zone 'utc')::date - 30;
+$$;
+
+create or replace function public.record_product_activity(
+    p_article_number text, p_action text, p_user_name text, p_at timestamptz
+) returns void
+language sql as $$
+    update public.products
+       set last_movement_at = greatest(last_movement_at, p_at),
+           last_taken_by    = case when p_action = 'take' then nullif(p_user_name, '') else last_taken_by end,
+           last_returned_at = case when p_action = 'return' then greatest(last_returned_at, p_at) else last_returned_at end,
+           takes_30d        = case when p_action = 'take' then public._takes_30d(p_article_number) else takes_30d end
+     where article_number = p_article_number;
+$$;
+
+create or replace function public.refresh_product_takes_30d() returns integer
+language plpgsql as $$
+declare
+    v_rows integer;
+begin
+    update public.products p
+       set takes_30d = t.total
+      from (
+            select p2.id, coalesce(sum(r.quantity), 0)::bigint as total
+              from public.products p2
+              left join public.usage_daily_rollup r
+                on r.article_number = p2.article_number
+               and r.action = 'take'
+               and r.day > (now() at time zone 'utc')::date - 30
+             group by p2.id
+           ) t
+     where t.id = p.id
+       and p.takes_30d is distinct from t.total;
+    get diagnostics v_rows = row_count;
+    return v_rows;
+end;
+$$;
+
+-- Full recompute from the hot and archived logs (see 016)
+create or replace function public.refresh_product_activity() returns integer
+language plpgsql as $$
+declare
+    v_rows integer;
+begin
+    update public.products p
+       set last_movement_at = a.last_movement_at,
+           last_taken_by    = a.last_taken_by,
+           last_returned_at = a.last_returned_at
+      from (
+            select p2.id, l.last_movement_at, l.last_taken_by, l.last_returned_at
+              from public.products p2
+              left join (
+                    select article_number,
+                           max("timestamp"::timestamptz) as last_movement_at,
+                           max("timestamp"::timestamptz) filter (where action = 'return') as last_returned_at,
+                           (array_agg(nullif(user_name, '') order by "timestamp"::timestamptz desc)
+                                filter (where action = 'take'))[1] as last_taken_by
+                      from public.logs_all
+                     group by article_number
+                   ) l on l.article_number = p2.article_number
+           ) a
+     where a.id = p.id;
+    get diagnostics v_rows = row_count;
+
+    perform public.refresh_product_takes_30d();
+    return v_rows;
+end;
+$$;
@@ -0,0 +1,32 @@
+-- All-time usage totals for the analytics page, grouped in the database so
+-- the page reads a handful of rows instead of every usage_daily_rollup row
+-- (which would also be cut off at PostgREST's max_rows).
+--   p_by     'user' | 'article' | 'day'
+--   p_since  only days on or after this date (null = all history)
+--   p_limit  top N by quantity (null = every key; 'day' is ordered by day)
+
+create index if not exists usage_daily_rollup_action_article_idx
+    on public.usage_daily_rollup (action, article_number);
+
+create or replace function public.usage_totals(
+    p_by text,
+    p_action text default 'take',
+    p_since date default null,
+    p_limit integer default null
+) returns table (key text, quantity bigint, movements bigint)
+language sql stable as $$
+    select case p_by
+               when 'user'    then r.user_name
+               when 'article' then r.article_number
+               else r.day::text
+           end as key,
+           sum(r.quantity)::bigint,
+           sum(r.movements)::bigint
+      from public.usage_daily_rollup r
+     where (p_action is null or r.action = p_action)
+       and (p_since is null or r.day >= p_since)
+       and (p_by <> 'user' or r.user_name <> '')
+     group by 1
+     order by case when p_by = 'day' then null else sum(r.quantity) end desc nulls last, 1
+     limit p_limit;
+$$;
@@ -0,0 +1,23 @@
+-- usage_daily_rollup.updated_at moves on every bump and backfill upsert, so
+-- cached views computed from the rollup (result_cache USAGE_ROLLUP) are
+-- invalidated by rollup writes, not only by log inserts. Reuses
+-- touch_updated_at() from 002.
+
+alter table public.usage_daily_rollup
+    add column if not exists updated_at timestamptz not null default now();
+
+drop trigger if exists usage_daily_rollup_touch_updated_at on public.usage_daily_rollup;
+create trigger usage_daily_rollup_touch_updated_at
+    before update on public.usage_daily_rollup
+    for each row execute function public.touch_updated_at();
+
+create index if not exists usage_daily_rollup_updated_at_idx on public.usage_daily_rollup (updated_at desc);
+
+-- Every user with at least one movement, as one array value (a set-returning
+-- function would be cut off at PostgREST's max_rows).
+create or replace function public.usage_user_names() returns text[]
+language sql stable as $$
+    select coalesce(array_agg(distinct user_name order by user_name), '{}')
+      from public.usage_daily_rollup
+     where user_name <> '';
+$$;
@@ -0,0 +1,28 @@
+-- Per-article usage statistics for the reorder-point job, computed in the
+-- database from usage_daily_rollup: the sum of the daily totals and the sum
+-- of their squares (days without movements add nothing to either). Paged by
+-- article_number (p_after / p_limit) so no page exceeds PostgREST's max_rows.
+
+create or replace function public.article_usage_stats(
+    p_since date,
+    p_action text default 'take',
+    p_after text default null,
+    p_limit integer default 1000
+) returns table (article_number text, total bigint, total_sq numeric, active_days integer)
+language sql stable as $$
+    select d.article_number,
+           sum(d.qty)::bigint,
+           sum(d.qty::numeric * d.qty),
+           count(*)::integer
+      from (
+            select r.article_number, r.day, sum(r.quantity) as qty
+              from public.usage_daily_rollup r
+             where r.day >= p_since
+               and r.action = p_action
+               and (p_after is null or r.article_number > p_after)
+             group by r.article_number, r.day
+           ) d
+     group by d.article_number
+     order by d.article_number
+     limit p_limit;
+$$;
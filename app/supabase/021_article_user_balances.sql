@@ -0,0 +1,29 @@
+-- Net quantity taken (takes minus returns) per article and user, for the
+-- catalog's "who has it" lists: the hot logs summed in the database plus the
+-- totals carried forward in logs_archived_balances (see 016). Returned as one
+-- jsonb array so the result is not cut off at PostgREST's max_rows.
+
+create or replace function public.article_user_balances(p_articles text[]) returns jsonb
+language sql stable as $$
+    select coalesce(jsonb_agg(jsonb_build_object(
+               'article_number', b.article_number,
+               'user_name', b.user_name,
+               'net', b.net
+           ) order by b.article_number, b.user_name), '[]'::jsonb)
+      from (
+            select t.article_number, t.user_name, sum(t.net)::bigint as net
+              from (
+                    select l.article_number,
+                           coalesce(l.user_name, '') as user_name,
+                           case when l.quantity::text ~ '^\s*-?\d+\s*$' then trim(l.quantity::text)::bigint else 0 end
+                               * case l.action when 'take' then 1 when 'return' then -1 else 0 end as net
+                      from public.logs l
+                     where l.article_number = any(p_articles)
+                    union all
+                    select a.article_number, a.user_name, a.taken - a.returned
+                      from public.logs_archived_balances a
+                     where a.article_number = any(p_articles)
+                   ) t
+             group by t.article_number, t.user_name
+           ) b;
+$$;
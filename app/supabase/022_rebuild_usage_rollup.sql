@@ -0,0 +1,38 @@
+-- Backfill of usage_daily_rollup computed in the database, one day range per
+-- call (`flask backfill-usage-rollups` walks the history month by month).
+-- The range is deleted and re-aggregated from logs_all in one transaction
+-- under an exclusive lock on the rollup, so bump_usage_rollup() calls wait
+-- for it and add their increment on top of the rebuilt totals instead of
+-- being overwritten. A movement logged but not yet bumped when its day is
+-- rebuilt is still counted twice; rebuild that day again if it matters.
+
+create index if not exists logs_archive_timestamp_idx on public.logs_archive ("timestamp");
+
+create or replace function public.rebuild_usage_rollup(p_from date, p_to date) returns integer
+language plpgsql as $$
+declare
+    v_rows integer;
+begin
+    lock table public.usage_daily_rollup in exclusive mode;
+
+    delete from public.usage_daily_rollup
+     where day between p_from and p_to;
+
+    insert into public.usage_daily_rollup (day, article_number, user_name, action, quantity, movements)
+    select (l."timestamp"::timestamptz at time zone 'utc')::date,
+           trim(l.article_number),
+           coalesce(l.user_name, ''),
+           lower(trim(l.action)),
+           sum(case when l.quantity::text ~ '^\s*-?\d+(\.\d+)?\s*$' then trunc(trim(l.quantity::text)::numeric) else 0 end)::bigint,
+           count(*)::integer
+      from public.logs_all l
+     where l."timestamp"::timestamptz >= p_from::timestamp at time zone 'utc'
+       and l."timestamp"::timestamptz < (p_to + 1)::timestamp at time zone 'utc'
+       and coalesce(trim(l.article_number), '') <> ''
+       and coalesce(trim(l.action), '') <> ''
+     group by 1, 2, 3, 4;
+    get diagnostics v_rows = row_count;
+
+    return v_rows;
+end;
+$$;
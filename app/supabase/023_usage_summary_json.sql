@@ -0,0 +1,45 @@
+-- usage_summary() (005) as one jsonb array: a set-returning function is cut
+-- off at PostgREST's max_rows, which a year of days x articles exceeds.
+-- Same parameters, rows and order as before.
+
+drop function if exists public.usage_summary(date, date, text, text, text);
+
+create or replace function public.usage_summary(
+    p_from date,
+    p_to date,
+    p_group_by text,              -- 'day' | 'week' | 'month'
+    p_by text,                    -- 'user' | 'article' | 'category'
+    p_action text default 'take'  -- null = every action
+) returns jsonb
+language sql stable as $$
+    with base as (
+        select
+            date_trunc(p_group_by, r.day::timestamp)::date as period,
+            case p_by
+                when 'user'    then r.user_name
+                when 'article' then r.article_number
+                else coalesce(nullif(p.category, ''), 'Undecided')
+            end as key,
+            case p_by
+                when 'article' then coalesce(nullif(p.product_name, ''), r.article_number)
+                when 'user'    then r.user_name
+                else coalesce(nullif(p.category, ''), 'Undecided')
+            end as label,
+            r.quantity,
+            r.movements
+        from public.usage_daily_rollup r
+        left join public.products p on p.article_number = r.article_number
+        where r.day between p_from and p_to
+          and (p_action is null or r.action = p_action)
+    ), totals as (
+        select period, key, max(label) as label,
+               sum(quantity)::bigint as quantity, sum(movements)::bigint as movements
+        from base
+        group by period, key
+    )
+    select coalesce(jsonb_agg(jsonb_build_object(
+               'period', period, 'key', key, 'label', label,
+               'quantity', quantity, 'movements', movements
+           ) order by period, quantity desc), '[]'::jsonb)
+    from totals;
+$$;
@@ -0,0 +1,42 @@
+-- One user's movements per article for /user_stats: takes, returns, rows and
+-- the last movement, over the hot logs plus the totals carried forward in
+-- logs_archived_balances (016). Returned as one jsonb array so a busy user is
+-- not cut off at PostgREST's max_rows.
+
+create index if not exists logs_user_name_idx on public.logs (user_name);
+
+create or replace function public.user_article_totals(p_user_name text) returns jsonb
+language sql stable as $$
+    select coalesce(jsonb_agg(jsonb_build_object(
+               'article_number', t.article_number,
+               'taken', t.taken,
+               'returned', t.returned,
+               'movements', t.movements,
+               'last_at', t.last_at
+           ) order by t.article_number), '[]'::jsonb)
+      from (
+            select u.article_number,
+                   sum(u.taken)::bigint     as taken,
+                   sum(u.returned)::bigint  as returned,
+                   sum(u.movements)::bigint as movements,
+                   max(u.last_at)           as last_at
+              from (
+                    select coalesce(l.article_number, '') as article_number,
+                           case when l.action = 'take' then q.qty else 0 end as taken,
+                           case when l.action = 'return' then q.qty else 0 end as returned,
+                           1 as movements,
+                           l."timestamp"::timestamptz as last_at
+                      from public.logs l
+                     cross join lateral (
+                            select case when l.quantity::text ~ '^\s*-?\d+\s*$'
+                                        then trim(l.quantity::text)::bigint else 0 end as qty
+                           ) q
+                     where l.user_name = p_user_name
+                    union all
+                    select a.article_number, a.taken, a.returned, a.archived_rows, a.last_at
+                      from public.logs_archived_balances a
+                     where a.user_name = p_user_name
+                   ) u
+             group by u.article_number
+           ) t;
+$$;